@@ -0,0 +1,231 @@
+"""
+
+Load test and latency benchmark for the CSTU Chatbot request path.
+
+Simulated users send a mix of questions through respond (or only get_relevant_info) concurrently, with the
+embedding model, vector index and completion model replaced by the local stand-ins in fakes.py, each with an
+injectable latency. The report is printed as JSON (and optionally written to a file) for regression tracking:
+
+- latency: p50/p95/p99 of time to first output and of total request time
+- throughput: completed requests per second
+- stages: mean and p95 seconds per request spent embedding, routing, retrieving and generating
+- caches: embedding cache and response cache hit rates
+
+Usage:
+    python bench_load.py --users 32 --requests 500 --mix popular=0.6,unique=0.3,chitchat=0.1 --output load.json
+
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import random
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+import main
+from embedding_cache import EmbeddingCache
+from fakes import FakeCompletionServer, FakeEmbedder, FakeIndex
+from metrics import track_request
+from response_cache import SemanticResponseCache
+from streaming import ChatStreamer
+from vector_store import LocalVectorStore
+
+# Frequently asked questions, sent verbatim (the traffic the response cache is for)
+POPULAR_QUERIES = [
+    "How much are the fees for international students?",
+    "Where is the university located?",
+    "What is CPT?",
+    "What is OPT?",
+    "When are the deadlines for fee payments?",
+    "Tell me about the Python class",
+    "Are there any jobs available on campus?",
+]
+
+# Templates for questions that are (almost) never repeated
+UNIQUE_TEMPLATES = [
+    "I am in semester {n}, what fees will I pay for course {n}?",
+    "Is there a teaching assistant position for section {n}?",
+    "How far is room {n} from the nearest coffee shop?",
+    "Does the deep learning course cover topic number {n}?",
+]
+
+CHITCHAT_QUERIES = [
+    "Hello!",
+    "Thanks, that helps.",
+    "Tell me a joke",
+]
+
+
+def parse_mix(text):
+    """
+    Parse a query mix such as 'popular=0.6,unique=0.3,chitchat=0.1'.
+
+    Returns:
+        dict: Query kind -> weight.
+    """
+    mix = {}
+    for part in text.split(","):
+        kind, weight = part.split("=")
+        if kind not in ("popular", "unique", "chitchat"):
+            raise ValueError("Unknown query kind '{}'".format(kind))
+        mix[kind] = float(weight)
+    return mix
+
+
+def make_query(kind, rng):
+    if kind == "popular":
+        return rng.choice(POPULAR_QUERIES)
+    if kind == "unique":
+        return rng.choice(UNIQUE_TEMPLATES).format(n=rng.randrange(10 ** 6))
+    return rng.choice(CHITCHAT_QUERIES)
+
+
+def install_fakes(args):
+    """
+    Point the chatbot's services at the local stand-ins and load the JSON data into the fake index.
+    """
+    embedder = FakeEmbedder(dimension=1536, latency=args.embed_latency)
+    main.embedding_cache = EmbeddingCache(embedder, "fake")  # memory-only, never touches the on-disk cache
+    main.index = LocalVectorStore() if args.index == "local" else FakeIndex(latency=args.index_latency)
+    completion = FakeCompletionServer(first_token_latency=args.first_token_latency, token_latency=args.token_latency)
+    main.chat_streamer = ChatStreamer(completion, args.max_concurrency)
+    main.chat_complete_messages = lambda messages, temperature=0.7: completion.complete(messages, temperature)
+    main.response_cache = SemanticResponseCache(main.RESPONSE_CACHE_THRESHOLD, ttl=main.RESPONSE_CACHE_TTL)
+    main.ROUTER_THRESHOLD = args.router_threshold
+    main.reset_intent_router()
+    with contextlib.redirect_stdout(io.StringIO()):
+        main.upsert_data(main.index)  # bypasses the manifest, which tracks the real index
+        main.get_intent_router()
+    # Count only the load test's own traffic
+    embedder.calls = embedder.texts_embedded = 0
+    main.embedding_cache.memory_hits = main.embedding_cache.disk_hits = main.embedding_cache.misses = 0
+    return embedder, completion
+
+
+async def run_request(target, query, session_id):
+    """
+    Send one request and time it.
+
+    Returns:
+        dict: Time to first output, total time and per-stage seconds.
+    """
+    with track_request() as stages:
+        start = time.perf_counter()
+        first_output = None
+        if target == "respond":
+            async for _ in main.respond(query, [], SimpleNamespace(session_hash=session_id)):
+                if first_output is None:
+                    first_output = time.perf_counter() - start
+        else:
+            metadata_type = await asyncio.to_thread(main.route_query, query)
+            if metadata_type:
+                await asyncio.to_thread(main.get_relevant_info, main.index, query, metadata_type)
+        total = time.perf_counter() - start
+    return {"first_output": first_output if first_output is not None else total, "total": total, "stages": stages}
+
+
+async def run_load(args):
+    rng = random.Random(args.seed)
+    mix = parse_mix(args.mix)
+    kinds, weights = list(mix), list(mix.values())
+    queue = asyncio.Queue()
+    for _ in range(args.requests):
+        queue.put_nowait(make_query(rng.choices(kinds, weights)[0], rng))
+
+    results = []
+
+    async def user(number):
+        asked = 0
+        while True:
+            try:
+                query = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            # Every request starts a new conversation, like a visitor asking one question; the response
+            # cache only serves questions without earlier history
+            results.append(await run_request(args.target, query, "user-{}-{}".format(number, asked)))
+            asked += 1
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):  # respond prints a line per request
+        await asyncio.gather(*(user(number) for number in range(args.users)))
+    return results, time.perf_counter() - start
+
+
+def summarize(values):
+    values = np.asarray(values, dtype=np.float64) * 1000
+    if values.size == 0:
+        return {}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"mean_ms": values.mean(), "p50_ms": p50, "p95_ms": p95, "p99_ms": p99, "max_ms": values.max()}
+
+
+def report(args, results, seconds, embedder, completion):
+    stage_names = sorted({name for result in results for name in result["stages"]})
+    return {
+        "config": vars(args),
+        "requests": len(results),
+        "seconds": seconds,
+        "throughput_rps": len(results) / seconds if seconds else 0.0,
+        "latency": {
+            "first_output": summarize([result["first_output"] for result in results]),
+            "total": summarize([result["total"] for result in results]),
+        },
+        "stages": {
+            name: summarize([result["stages"].get(name, 0.0) for result in results]) for name in stage_names
+        },
+        "caches": {
+            "embedding": main.embedding_cache.stats(),
+            "response": main.response_cache.stats(),
+        },
+        "backend_calls": {
+            "embedding_requests": embedder.calls,
+            "completion_requests": completion.requests,
+            "max_concurrent_completions": completion.max_in_flight,
+        },
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the chatbot request path against local fakes.")
+    parser.add_argument("--target", choices=("respond", "retrieve"), default="respond",
+                        help="drive the full respond path or only routing and retrieval")
+    parser.add_argument("--users", type=int, default=16, help="number of concurrent simulated users")
+    parser.add_argument("--requests", type=int, default=200, help="total number of requests")
+    parser.add_argument("--mix", default="popular=0.6,unique=0.3,chitchat=0.1",
+                        help="query mix as kind=weight pairs (kinds: popular, unique, chitchat)")
+    parser.add_argument("--index", choices=("local", "remote"), default="local",
+                        help="LocalVectorStore, or FakeIndex with --index-latency to simulate a remote index")
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="seconds per embedding request")
+    parser.add_argument("--index-latency", type=float, default=0.03, help="seconds per remote index call")
+    parser.add_argument("--first-token-latency", type=float, default=0.4, help="seconds to the first token")
+    parser.add_argument("--token-latency", type=float, default=0.02, help="seconds between tokens")
+    parser.add_argument("--max-concurrency", type=int, default=main.MAX_CONCURRENT_RESPONSES,
+                        help="maximum concurrent completions")
+    parser.add_argument("--router-threshold", type=float, default=0.2,
+                        help="intent router threshold (the fake embedder needs a low one)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the query sequence")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    return parser.parse_args(argv)
+
+
+def run(argv=None):
+    args = parse_args(argv)
+    embedder, completion = install_fakes(args)
+    results, seconds = asyncio.run(run_load(args))
+    result = report(args, results, seconds, embedder, completion)
+    text = json.dumps(result, indent=2, default=float)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+    return result
+
+
+if __name__ == "__main__":
+    run()
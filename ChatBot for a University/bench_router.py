@@ -0,0 +1,139 @@
+"""
+
+Intent routing benchmark for the CSTU Chatbot.
+
+Runs a small labeled set of student questions through the keyword baseline (keyword_route) and the centroid
+router, and reports routing accuracy and per-query latency for each. Router latency is split into embedding the
+question and classifying the embedding. The centroids are built from the documents only, without the sample
+questions in main.router_examples, so accuracy is measured on questions the router has not seen.
+
+Usage:
+    python bench_router.py            # uses the OpenAI embedding model
+    python bench_router.py --fake     # uses the local FakeEmbedder (no API key needed)
+
+Pass --threshold to try a different confidence threshold; the fake embedder's similarities run much lower than
+OpenAI's, so it needs a lower threshold than CSTU_ROUTER_THRESHOLD.
+
+"""
+
+import argparse
+import json
+import time
+
+import main
+from embedding_cache import EmbeddingCache
+from fakes import FakeEmbedder
+from intent_router import CentroidRouter
+
+# (question, expected metadata type); None means the question should not be routed to any type.
+# Kept disjoint from main.router_examples, and the benchmarked router is built without those examples, so no
+# question is scored against a centroid it was averaged into.
+LABELED_QUERIES = [
+    ("What is taught in the Python programming course?", "Course_Details"),
+    ("What will I learn in the cloud computing course?", "Course_Details"),
+    ("Is there a class on deep learning with TensorFlow?", "Course_Details"),
+    ("Which module covers prompt engineering?", "Course_Details"),
+    ("Do you offer anything about network security and AI?", "Course_Details"),
+    ("What does MB/CSE 648 cover?", "Course_Details"),
+    ("How much are the fees for international students?", "International_Students_faqs"),
+    ("How much does each course cost per credit?", "International_Students_faqs"),
+    ("What fees do I pay for a course?", "International_Students_faqs"),
+    ("Can I pay my tuition by credit card?", "International_Students_faqs"),
+    ("When is the payment deadline for this semester?", "International_Students_faqs"),
+    ("What is CPT?", "International_Students_faqs"),
+    ("Am I eligible for OPT after graduation?", "International_Students_faqs"),
+    ("What is SEVIS?", "International_Students_faqs"),
+    ("What are the application deadlines for the fall term?", "International_Students_faqs"),
+    ("Who do I contact about my student account?", "International_Students_faqs"),
+    ("Which city is CSTU in?", "Addresses"),
+    ("What is the address of the campus?", "Addresses"),
+    ("Is there a hospital near the university?", "Addresses"),
+    ("Where is the nearest police station?", "Addresses"),
+    ("Where can I get coffee near campus?", "Addresses"),
+    ("Can you recommend a restaurant nearby?", "Addresses"),
+    ("Is the university hiring students this term?", "On_Campus_Jobs"),
+    ("How do I become a teaching assistant?", "On_Campus_Jobs"),
+    ("What does a research assistant do?", "On_Campus_Jobs"),
+    ("Can I work part time at the university?", "On_Campus_Jobs"),
+    ("Is a teaching assistant position open for my class?", "On_Campus_Jobs"),
+    ("Hello!", None),
+    ("What's the weather like today?", None),
+    ("Tell me a joke", None),
+]
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def run(use_fake=False, threshold=None):
+    """
+    Route every labeled question with both routers.
+
+    Args:
+        use_fake (bool): Whether to embed with the local FakeEmbedder instead of OpenAI.
+        threshold (float): Confidence threshold for the centroid router (default is ROUTER_THRESHOLD).
+
+    Returns:
+        dict: Accuracy, mean per-query latency (ms) and misrouted questions for each router.
+    """
+    if use_fake:
+        # Memory-only, so fake vectors never land in the on-disk cache of real embeddings
+        main.embedding_cache = EmbeddingCache(FakeEmbedder(dimension=1536), "fake")
+    overlap = {query for query, _ in LABELED_QUERIES} & {text for _, text in main.router_examples}
+    assert not overlap, "benchmark queries also used as router examples: {}".format(sorted(overlap))
+    router, build_seconds = timed(
+        CentroidRouter.from_documents, main.iter_documents(main.json_data), main.get_embeddings, main.ROUTER_THRESHOLD
+    )
+    if threshold is not None:
+        router.threshold = threshold
+
+    keyword = {"correct": 0, "seconds": 0.0, "errors": []}
+    centroid = {"correct": 0, "embed_seconds": 0.0, "classify_seconds": 0.0, "errors": []}
+    for query, expected in LABELED_QUERIES:
+        predicted, seconds = timed(main.keyword_route, query)
+        keyword["seconds"] += seconds
+        if predicted == expected:
+            keyword["correct"] += 1
+        else:
+            keyword["errors"].append({"query": query, "expected": expected, "predicted": predicted})
+
+        embedding, embed_seconds = timed(main.get_embeddings, [query])
+        (predicted, confidence), classify_seconds = timed(router.route, embedding[0])
+        centroid["embed_seconds"] += embed_seconds
+        centroid["classify_seconds"] += classify_seconds
+        if predicted == expected:
+            centroid["correct"] += 1
+        else:
+            centroid["errors"].append(
+                {"query": query, "expected": expected, "predicted": predicted, "confidence": round(confidence, 3)}
+            )
+
+    n = len(LABELED_QUERIES)
+    return {
+        "queries": n,
+        "embedder": "fake" if use_fake else main.EMBEDDING_MODEL,
+        "keyword": {
+            "accuracy": keyword["correct"] / n,
+            "latency_ms": keyword["seconds"] / n * 1000,
+            "errors": keyword["errors"],
+        },
+        "centroid": {
+            "accuracy": centroid["correct"] / n,
+            "threshold": router.threshold,
+            "build_ms": build_seconds * 1000,
+            "embed_latency_ms": centroid["embed_seconds"] / n * 1000,
+            "classify_latency_ms": centroid["classify_seconds"] / n * 1000,
+            "errors": centroid["errors"],
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark keyword vs. centroid intent routing.")
+    parser.add_argument("--fake", action="store_true", help="use the local fake embedder instead of OpenAI")
+    parser.add_argument("--threshold", type=float, help="confidence threshold for the centroid router")
+    args = parser.parse_args()
+    print(json.dumps(run(args.fake, args.threshold), indent=2))
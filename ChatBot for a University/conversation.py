@@ -0,0 +1,178 @@
+"""
+
+Per-session conversation memory for the CSTU Chatbot.
+
+- Token Budget: every prompt holds the system prompt, a rolling summary of older turns, as many recent turns as
+  fit in the budget, and the new user message.
+- Rolling Summary: turns that fall out of the window are folded into the summary by a summarizer function, so
+  prompt size stays bounded however long the conversation runs.
+- Sessions: each chat session gets its own memory; idle sessions are evicted once the store is full.
+
+Token counts use tiktoken when it is installed and a characters-per-token estimate otherwise.
+
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+
+try:
+    import tiktoken
+except ImportError:  # fall back to a character-based estimate
+    tiktoken = None
+
+# Tokens the chat format adds around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+class TokenCounter:
+    """
+    Count prompt tokens for a chat model.
+
+    Args:
+        model (str): Model name used to pick the tiktoken encoding.
+    """
+
+    def __init__(self, model="gpt-4"):
+        self._encoding = None
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self._encoding = tiktoken.get_encoding("cl100k_base")
+
+    def count_text(self, text):
+        if self._encoding is not None:
+            return len(self._encoding.encode(text))
+        return (len(text) + 3) // 4
+
+    def count_messages(self, messages):
+        return sum(self.count_text(message['content']) + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+
+class ConversationMemory:
+    """
+    Bounded chat history for one session.
+
+    Args:
+        system_prompt (str): The system prompt sent at the start of every request.
+        max_prompt_tokens (int): Token budget for the whole prompt, including the new user message.
+        summarize_fn (callable): Function (summary, turns) -> new summary, where turns is a list of
+            (user_message, assistant_message) tuples. If None, turns outside the window are dropped.
+        token_counter (TokenCounter): Counter used to measure messages.
+        compact_ratio (float): When the window overflows, recent turns are trimmed to this fraction of the
+            space left for them, so the summarizer runs once per several turns rather than on every turn.
+    """
+
+    def __init__(self, system_prompt, max_prompt_tokens=3000, summarize_fn=None, token_counter=None,
+                 compact_ratio=0.5):
+        self.system_message = {'role': 'system', 'content': system_prompt}
+        self.max_prompt_tokens = max_prompt_tokens
+        self.compact_ratio = compact_ratio
+        self.summarize_fn = summarize_fn
+        self.token_counter = token_counter or TokenCounter()
+        self.summary = ""
+        self.turns = deque()
+        self.last_prompt_tokens = 0
+
+    def _summary_messages(self):
+        if not self.summary:
+            return []
+        return [{'role': 'system', 'content': "Summary of the earlier conversation:\n" + self.summary}]
+
+    @staticmethod
+    def _turn_messages(turn):
+        user_message, assistant_message = turn
+        return [{'role': 'user', 'content': user_message}, {'role': 'assistant', 'content': assistant_message}]
+
+    def build_messages(self, message, context=None):
+        """
+        Build the prompt for a new user message, moving turns that no longer fit into the summary.
+
+        Args:
+            message (str): The new user message.
+            context (str): Optional retrieved information to include just before the message.
+
+        Returns:
+            list: Messages for the chat completion API.
+        """
+        count = self.token_counter.count_messages
+        fixed = [self.system_message] + self._summary_messages()
+        user = [{'role': 'user', 'content': message}]
+        if context:
+            user.insert(0, {'role': 'system', 'content': context})
+
+        budget = self.max_prompt_tokens - count(fixed) - count(user)
+        kept = self._turns_within(budget)
+        if kept < len(self.turns):
+            kept = self._turns_within(int(budget * self.compact_ratio))
+
+        evicted = [self.turns.popleft() for _ in range(len(self.turns) - kept)]
+        if evicted and self.summarize_fn is not None:
+            self.summary = self.summarize_fn(self.summary, evicted)
+            fixed = [self.system_message] + self._summary_messages()
+
+        messages = fixed + [m for turn in self.turns for m in self._turn_messages(turn)] + user
+        self.last_prompt_tokens = count(messages)
+        return messages
+
+    def _turns_within(self, budget):
+        """
+        Count how many of the most recent turns fit in the token budget.
+        """
+        kept = 0
+        for turn in reversed(self.turns):
+            cost = self.token_counter.count_messages(self._turn_messages(turn))
+            if cost > budget:
+                break
+            budget -= cost
+            kept += 1
+        return kept
+
+    def add_turn(self, message, response):
+        self.turns.append((message, response))
+
+    def clear(self):
+        self.summary = ""
+        self.turns.clear()
+
+    def is_empty(self):
+        """
+        Whether the conversation has no earlier turns or summary, so an answer depends only on the question.
+        """
+        return not self.turns and not self.summary
+
+
+class SessionStore:
+    """
+    Conversation memories keyed by session id, evicting the least recently used session when full.
+
+    Args:
+        factory (callable): Function returning a new ConversationMemory.
+        max_sessions (int): Maximum number of sessions kept in memory.
+        idle_timeout (float): Seconds after which an unused session is discarded.
+    """
+
+    def __init__(self, factory, max_sessions=1000, idle_timeout=3600):
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._sessions = OrderedDict()  # session id -> (memory, last used time)
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            memory = entry[0] if entry and now - entry[1] < self.idle_timeout else self.factory()
+            self._sessions[session_id] = (memory, now)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return memory
+
+    def reset(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._sessions)
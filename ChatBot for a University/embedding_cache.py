@@ -0,0 +1,170 @@
+"""
+
+Two-tier embedding cache for the CSTU Chatbot.
+
+- Memory Tier: an in-process LRU of recently used embeddings.
+- Disk Tier: a SQLite table of float32 vectors that survives restarts, evicting the least recently used rows
+  once it grows past its size limit.
+- Keys: embeddings are keyed by embedding model name and normalized text (case and whitespace insensitive).
+- Counters: memory hits, disk hits and misses are exposed through stats().
+
+"""
+
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+
+def normalize_text(text):
+    """
+    Normalize text for use as a cache key.
+
+    Args:
+        text (str): The text to normalize.
+
+    Returns:
+        str: Lowercased text with runs of whitespace collapsed to single spaces.
+    """
+    return " ".join(text.lower().split())
+
+
+class EmbeddingCache:
+    """
+    Memoizing wrapper around an embedding function.
+
+    Args:
+        embed_fn (callable): Function mapping a list of texts to a list of embeddings.
+        model (str): Name of the embedding model, part of every cache key.
+        path (str): Location of the SQLite database, or None for a memory-only cache. The database is only
+            opened (and created) on the first lookup.
+        memory_size (int): Maximum number of embeddings held in the in-process LRU.
+        disk_size (int): Maximum number of embeddings kept on disk.
+    """
+
+    def __init__(self, embed_fn, model, path=None, memory_size=1024, disk_size=100000):
+        self.embed_fn = embed_fn
+        self.model = model
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self.memory_hits = self.disk_hits = self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.path = path
+        self._db = None
+
+    def _connect(self):
+        # Called with the lock held; None for a memory-only cache
+        if self._db is None and self.path is not None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, key TEXT NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL, "
+                "PRIMARY KEY (model, key))"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+            self._db.commit()
+        return self._db
+
+    def __call__(self, texts):
+        """
+        Embed texts, calling the wrapped function only for texts not found in either tier.
+
+        Args:
+            texts (list): A list of strings to generate embeddings for.
+
+        Returns:
+            list: A list of embeddings corresponding to the input texts.
+        """
+        keys = [normalize_text(text) for text in texts]
+        results = {}
+        with self._lock:
+            for key in keys:
+                if key not in results:
+                    vector = self._get(key)
+                    if vector is not None:
+                        results[key] = vector
+
+            # Embed each distinct missing text once, in a single request
+            missing = OrderedDict((key, text) for key, text in zip(keys, texts) if key not in results)
+            self.misses += len(missing)
+
+        if missing:
+            vectors = self.embed_fn(list(missing.values()))
+            with self._lock:
+                for key, vector in zip(missing, vectors):
+                    results[key] = vector
+                    self._put_memory(key, vector)
+                self._put_disk(zip(missing, vectors))
+
+        return [results[key] for key in keys]
+
+    def _get(self, key):
+        vector = self._memory.get(key)
+        if vector is not None:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return vector
+        if self._connect() is None:
+            return None
+        row = self._db.execute(
+            "SELECT vector FROM embeddings WHERE model = ? AND key = ?", (self.model, key)
+        ).fetchone()
+        if row is None:
+            return None
+        self._db.execute(
+            "UPDATE embeddings SET last_used = ? WHERE model = ? AND key = ?", (time.time(), self.model, key)
+        )
+        self._db.commit()
+        vector = array("f")
+        vector.frombytes(row[0])
+        vector = vector.tolist()
+        self._put_memory(key, vector)
+        self.disk_hits += 1
+        return vector
+
+    def _put_memory(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _put_disk(self, items):
+        if self._connect() is None:
+            return
+        now = time.time()
+        self._db.executemany(
+            "INSERT OR REPLACE INTO embeddings (model, key, vector, last_used) VALUES (?, ?, ?, ?)",
+            [(self.model, key, array("f", vector).tobytes(), now) for key, vector in items],
+        )
+        (count,) = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        if count > self.disk_size:
+            self._db.execute(
+                "DELETE FROM embeddings WHERE rowid IN "
+                "(SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                (count - self.disk_size,),
+            )
+        self._db.commit()
+
+    def stats(self):
+        """
+        Cache hit/miss counters.
+
+        Returns:
+            dict: Memory hits, disk hits, misses, overall hit rate and the current size of the memory tier.
+        """
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+            }
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
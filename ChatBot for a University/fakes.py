@@ -0,0 +1,171 @@
+"""
+
+Local stand-ins for the CSTU Chatbot's remote services.
+
+- FakeEmbedder: deterministic hashed bag-of-words embeddings, with optional latency and failure injection.
+- FakeIndex: a pure-Python in-memory VectorStore with optional latency, standing in for the remote Pinecone index.
+- FakeCompletionServer: streams a canned reply in the OpenAI streaming chunk format, with configurable latency.
+
+These let the ingestion, retrieval and chat code run without OpenAI or Pinecone credentials.
+
+"""
+
+import asyncio
+import hashlib
+import math
+import random
+import re
+import threading
+import time
+
+from vector_store import VectorStore
+
+
+class FakeServiceError(Exception):
+    """
+    Transient error raised by the fakes when failure injection is enabled.
+    """
+
+
+class FakeEmbedder:
+    """
+    Deterministic embedding function. Each word is hashed into one of `dimension` buckets,
+    so texts that share words get similar vectors.
+
+    Args:
+        dimension (int): Length of the generated vectors.
+        latency (float): Seconds to sleep per call, to simulate a network round trip.
+        failure_rate (float): Probability that a call raises FakeServiceError.
+        seed (int): Seed for the failure injection.
+    """
+
+    def __init__(self, dimension=256, latency=0.0, failure_rate=0.0, seed=0):
+        self.dimension = dimension
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self.texts_embedded = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def embed(self, text):
+        vector = [0.0] * self.dimension
+        for word in re.findall(r"[a-z0-9]+", text.lower()):
+            digest = hashlib.md5(word.encode("utf-8")).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimension
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def __call__(self, texts):
+        with self._lock:
+            self.calls += 1
+            fail = self._random.random() < self.failure_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise FakeServiceError("injected embedding failure")
+        with self._lock:
+            self.texts_embedded += len(texts)
+        return [self.embed(text) for text in texts]
+
+
+class FakeIndex(VectorStore):
+    """
+    In-memory brute-force index simulating a remote VectorStore.
+
+    Args:
+        latency (float): Seconds to sleep per call, to simulate a network round trip.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.namespaces = {}
+        self.upsert_calls = 0
+        self.query_calls = 0
+        self._lock = threading.Lock()
+
+    def upsert(self, vectors, namespace=""):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.upsert_calls += 1
+            stored = self.namespaces.setdefault(namespace, {})
+            for vector_id, values, metadata in vectors:
+                stored[vector_id] = (list(values), dict(metadata))
+        return {"upserted_count": len(vectors)}
+
+    def delete(self, ids, namespace=""):
+        with self._lock:
+            stored = self.namespaces.get(namespace, {})
+            for vector_id in ids:
+                stored.pop(vector_id, None)
+
+    def delete_namespace(self, namespace=""):
+        with self._lock:
+            self.namespaces.pop(namespace, None)
+
+    def query(self, vector, top_k=5, include_metadata=False, namespace=""):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.query_calls += 1
+            items = list(self.namespaces.get(namespace, {}).items())
+        scored = sorted(
+            ((sum(a * b for a, b in zip(vector, values)), vector_id, metadata)
+             for vector_id, (values, metadata) in items),
+            key=lambda item: item[0],
+            reverse=True,
+        )
+        matches = []
+        for score, vector_id, metadata in scored[:top_k]:
+            match = {"id": vector_id, "score": score}
+            if include_metadata:
+                match["metadata"] = metadata
+            matches.append(match)
+        return {"matches": matches}
+
+
+class FakeCompletionServer:
+    """
+    Streaming chat completion stand-in. Calling it with (messages, temperature) returns an async iterator
+    of chunks shaped like openai.ChatCompletion.acreate(..., stream=True) output.
+
+    Args:
+        reply (str): The canned reply, streamed one word (with its leading whitespace) per chunk.
+        first_token_latency (float): Seconds before the first chunk.
+        token_latency (float): Seconds between subsequent chunks.
+    """
+
+    def __init__(self, reply="This is a canned answer from the fake completion server.",
+                 first_token_latency=0.2, token_latency=0.02):
+        self.tokens = re.findall(r"\s*\S+", reply)
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, messages, temperature=0.7):
+        self.requests += 1
+        return self._stream()
+
+    async def _stream(self):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.first_token_latency)
+            for i, token in enumerate(self.tokens):
+                if i:
+                    await asyncio.sleep(self.token_latency)
+                yield {'choices': [{'delta': {'content': token}}]}
+        finally:
+            self.in_flight -= 1
+
+    def complete(self, messages, temperature=0.7):
+        """
+        Blocking, non-streaming completion returning the whole canned reply.
+        """
+        time.sleep(self.first_token_latency + self.token_latency * max(len(self.tokens) - 1, 0))
+        self.requests += 1
+        return "".join(self.tokens)
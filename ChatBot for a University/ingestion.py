@@ -0,0 +1,132 @@
+"""
+
+Batched embedding ingestion for the CSTU Chatbot.
+
+- Batching: documents are grouped into embedding requests bounded by document count and total text size.
+- Concurrency: batches are embedded on a thread pool with a bounded number of requests in flight.
+- Retries: failed embedding requests are retried with exponential backoff and jitter.
+- Bulk Upsert: embedded vectors are written to the index in bulk as batches complete, into one namespace per
+  metadata type.
+- Stats: ingest_documents returns counters and throughput (docs/sec) for the run.
+
+"""
+
+import random
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# A document to ingest: metadata type (e.g. 'Course_Details'), vector id and the text to embed
+Document = namedtuple("Document", ["metadata_type", "doc_id", "text"])
+
+
+class IngestStats(namedtuple("IngestStats", ["documents", "batches", "retries", "upserts", "seconds"])):
+    """
+    Summary of a single ingestion run.
+    """
+
+    @property
+    def docs_per_sec(self):
+        return self.documents / self.seconds if self.seconds > 0 else float("inf")
+
+
+def chunk_documents(documents, max_batch_size=64, max_batch_chars=24000):
+    """
+    Group documents into size-bounded embedding requests.
+
+    Args:
+        documents (iterable): Document tuples to group.
+        max_batch_size (int): Maximum number of documents per request.
+        max_batch_chars (int): Maximum total characters per request (a proxy for the token limit).
+            A single document longer than this is sent on its own.
+
+    Yields:
+        list: Lists of Document tuples, one per embedding request.
+    """
+    batch, batch_chars = [], 0
+    for doc in documents:
+        if batch and (len(batch) >= max_batch_size or batch_chars + len(doc.text) > max_batch_chars):
+            yield batch
+            batch, batch_chars = [], 0
+        batch.append(doc)
+        batch_chars += len(doc.text)
+    if batch:
+        yield batch
+
+
+def embed_with_retry(embed_fn, texts, max_retries=5, base_delay=0.5, max_delay=20.0, retry_on=(Exception,)):
+    """
+    Call the embedding function, retrying transient failures with exponential backoff.
+
+    Args:
+        embed_fn (callable): Function mapping a list of texts to a list of embeddings.
+        texts (list): The texts to embed.
+        max_retries (int): Number of retries after the first attempt.
+        base_delay (float): Delay in seconds before the first retry; doubled on each retry.
+        max_delay (float): Upper bound on a single delay in seconds.
+        retry_on (tuple): Exception types that are considered transient.
+
+    Returns:
+        tuple: The list of embeddings and the number of retries that were needed.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return embed_fn(texts), attempt
+        except retry_on:
+            if attempt == max_retries:
+                raise
+            delay = min(max_delay, base_delay * 2 ** attempt)
+            time.sleep(delay * random.uniform(0.5, 1.0))  # jitter so parallel workers don't retry in lockstep
+
+
+def ingest_documents(index, documents, embed_fn, max_batch_size=64, max_batch_chars=24000, max_workers=4,
+                     upsert_batch_size=100, max_retries=5, base_delay=0.5, retry_on=(Exception,)):
+    """
+    Embed documents in concurrent batches and upsert the vectors into the index in bulk.
+
+    Args:
+        index (VectorStore): The vector store to upsert into.
+        documents (iterable): Document tuples to ingest.
+        embed_fn (callable): Function mapping a list of texts to a list of embeddings.
+        max_batch_size (int): Maximum number of documents per embedding request.
+        max_batch_chars (int): Maximum total characters per embedding request.
+        max_workers (int): Maximum number of embedding requests in flight.
+        upsert_batch_size (int): Maximum number of vectors per upsert call.
+        max_retries (int): Retries per embedding request before giving up.
+        base_delay (float): Initial backoff delay in seconds.
+        retry_on (tuple): Exception types that are considered transient.
+
+    Returns:
+        IngestStats: Counters and elapsed time for the run.
+    """
+    start = time.perf_counter()
+    batches = list(chunk_documents(documents, max_batch_size, max_batch_chars))
+    n_documents = retries = upserts = 0
+    pending = {}  # namespace (metadata type) -> vectors waiting to be upserted
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(embed_with_retry, embed_fn, [doc.text for doc in batch],
+                            max_retries, base_delay, retry_on=retry_on): batch
+            for batch in batches
+        }
+        for future in as_completed(futures):
+            batch = futures[future]
+            embeddings, batch_retries = future.result()
+            retries += batch_retries
+            n_documents += len(batch)
+            for doc, embedding in zip(batch, embeddings):
+                vectors = pending.setdefault(doc.metadata_type, [])
+                vectors.append((doc.doc_id, embedding, {"type": doc.metadata_type, "text": doc.text}))
+                # Upsert while other batches are still being embedded
+                if len(vectors) >= upsert_batch_size:
+                    index.upsert(vectors=vectors, namespace=doc.metadata_type)
+                    pending[doc.metadata_type] = []
+                    upserts += 1
+
+    for namespace, vectors in pending.items():
+        if vectors:
+            index.upsert(vectors=vectors, namespace=namespace)
+            upserts += 1
+
+    return IngestStats(n_documents, len(batches), retries, upserts, time.perf_counter() - start)
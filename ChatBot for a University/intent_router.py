@@ -0,0 +1,85 @@
+"""
+
+Embedding-based intent routing for the CSTU Chatbot.
+
+- Centroids: every metadata type is represented by the normalized mean embedding of its documents.
+- Routing: a query embedding is scored against all centroids in one matrix product; the best type is returned
+  with its cosine similarity as the confidence, or None when the confidence is below the threshold.
+
+"""
+
+import numpy as np
+
+
+class CentroidRouter:
+    """
+    Nearest-centroid classifier over metadata types.
+
+    Args:
+        labels (list): Metadata type of each centroid.
+        centroids (np.ndarray): (n_types, dimension) matrix of unit-normalized centroids.
+        threshold (float): Minimum cosine similarity for a query to be routed.
+    """
+
+    def __init__(self, labels, centroids, threshold=0.75):
+        self.labels = list(labels)
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.threshold = threshold
+
+    @classmethod
+    def from_documents(cls, documents, embed_fn, threshold=0.75, examples=()):
+        """
+        Build the router from the indexed documents.
+
+        Args:
+            documents (iterable): Document tuples; their texts are embedded and averaged per metadata type.
+            embed_fn (callable): Function mapping a list of texts to a list of embeddings.
+            threshold (float): Minimum cosine similarity for a query to be routed.
+            examples (iterable): Extra (metadata_type, text) pairs, such as sample questions, to include.
+
+        Returns:
+            CentroidRouter: The router.
+        """
+        pairs = [(doc.metadata_type, doc.text) for doc in documents] + list(examples)
+        vectors = np.asarray(embed_fn([text for _, text in pairs]), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+        labels = sorted({metadata_type for metadata_type, _ in pairs})
+        assignment = np.array([labels.index(metadata_type) for metadata_type, _ in pairs])
+        centroids = np.zeros((len(labels), vectors.shape[1]), dtype=np.float32)
+        np.add.at(centroids, assignment, vectors)
+        centroids /= np.linalg.norm(centroids, axis=1, keepdims=True)
+        return cls(labels, centroids, threshold)
+
+    def route_batch(self, vectors):
+        """
+        Route several query embeddings at once.
+
+        Args:
+            vectors (list): Query embeddings.
+
+        Returns:
+            list: (metadata_type or None, confidence) for each query.
+        """
+        queries = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        scores = (queries / norms) @ self.centroids.T
+        best = np.argmax(scores, axis=1)
+        confidences = scores[np.arange(len(best)), best]
+        return [
+            (self.labels[label] if confidence >= self.threshold else None, float(confidence))
+            for label, confidence in zip(best.tolist(), confidences.tolist())
+        ]
+
+    def route(self, vector):
+        """
+        Route one query embedding.
+
+        Args:
+            vector (list): The query embedding.
+
+        Returns:
+            tuple: The metadata type (None if below the threshold) and the confidence.
+        """
+        return self.route_batch([vector])[0]
@@ -4,25 +4,38 @@ CSTU Chatbot
 GPT Application Project
 Team 2 - Akshat, Asma, Atilla, Maheswar, Kavya, Vishal
 
-- Environment Variable Loading: The code loads environment variables from a specified file to retrieve the OpenAI and Pinecone API keys.
+- Environment Variable Loading: The code loads environment variables from a specified file to retrieve the OpenAI and Pinecone API keys and the vector store settings.
 - JSON Data: The code includes hardcoded JSON data for courses, FAQs, jobs, and addresses.
-- Embedding Function: The get_embeddings function generates embeddings for input texts using OpenAI's embedding model.
-- Upsert Data: The upsert_data function inserts data into the Pinecone index, creating embeddings for each piece of data.
+- Embedding Function: The get_embeddings function generates embeddings for input texts using OpenAI's embedding model, served through a memory and SQLite cache (see embedding_cache.py).
+- Vector Store: The create_index function returns the local in-process vector store or the Pinecone index (see vector_store.py).
+- Upsert Data: The upsert_data function inserts data into the vector index, embedding documents in concurrent batches and upserting them in bulk (see ingestion.py).
+- Sync Data: The sync_data function re-embeds only new or changed documents and deletes removed ones, using a content-hash manifest (see manifest.py).
 - Chat Completion: The chat_complete_messages function generates a response from the OpenAI model based on input messages.
-- Query Pinecone: The get_relevant_info function retrieves relevant information from the Pinecone index based on a query.
-- Respond Function: The respond function updates the chat history and generates responses.
+- Query Index: The get_relevant_info function retrieves relevant information from the vector index based on a query.
+- Intent Routing: The route_query function picks the metadata type for a question by nearest type centroid (see intent_router.py).
+- Respond Function: The respond function retrieves documents for questions about a known topic, answers repeated opening questions from a semantic response cache shared by all sessions (see response_cache.py), and otherwise streams responses token by token, using a per-session conversation memory bounded by a token budget (see conversation.py) and a concurrency-limited streamer that logs time to first token (see streaming.py).
 - Gradio Interface: The code uses Gradio to create a simple chat interface for interacting with the chatbot.
-- Main Function: The main function sets up the Pinecone index, inserts data, and runs the chatbot interface.
+- Main Function: The main function sets up the vector index, syncs data, and runs the chatbot interface.
 
 """
 
+import asyncio
 import os
 import json
 from dotenv import load_dotenv
 import openai
-from pinecone import Pinecone
 import gradio as gr
 
+from conversation import ConversationMemory, SessionStore, TokenCounter
+from embedding_cache import EmbeddingCache
+from ingestion import Document, ingest_documents
+from intent_router import CentroidRouter
+from manifest import sync_documents
+from metrics import stage
+from response_cache import SemanticResponseCache, context_fingerprint
+from streaming import ChatStreamer, StreamTiming
+from vector_store import LocalVectorStore, PineconeVectorStore
+
 # Load environment variables
 load_dotenv()
 
@@ -36,10 +49,32 @@ PINECONE_API_KEY = os.environ.get("PINECONE_API_KEY")
 
 openai.api_key = OPENAI_API_KEY
 
-# Initialize Pinecone
-pinecone_client = Pinecone(api_key=PINECONE_API_KEY)
+EMBEDDING_MODEL = "text-embedding-ada-002"
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Vector store backend: "local" (in-process NumPy index) or "pinecone" (the remote 'cstu-bot' index)
+VECTOR_BACKEND = os.environ.get("CSTU_VECTOR_BACKEND", "local")
+VECTOR_STORE_PATH = os.environ.get("CSTU_VECTOR_STORE", os.path.join(BASE_DIR, "vector_store"))
+
+# Records what is already in the index so startup only re-embeds changed documents.
+# The local store keeps its manifest alongside its vectors so the two are deleted together.
+MANIFEST_PATH = os.environ.get(
+    "CSTU_INDEX_MANIFEST",
+    os.path.join(VECTOR_STORE_PATH if VECTOR_BACKEND == "local" else BASE_DIR, "index_manifest.json")
+)
 
-index = pinecone_client.Index("cstu-bot")
+# On-disk tier of the embedding cache
+EMBEDDING_CACHE_PATH = os.environ.get("CSTU_EMBEDDING_CACHE", os.path.join(BASE_DIR, "embedding_cache.sqlite"))
+
+# OpenAI errors worth retrying during ingestion
+RETRYABLE_ERRORS = (
+    openai.error.RateLimitError,
+    openai.error.APIError,
+    openai.error.Timeout,
+    openai.error.ServiceUnavailableError,
+    openai.error.APIConnectionError,
+)
 
 # JSON data directly defined within the code
 json_data = {
@@ -152,9 +187,8 @@ json_data = {
     ]
 }
 
-# chatContext data defined within the code
-chatContext = [
-    {'role':'system', 'content': f"""
+# System prompt sent at the start of every conversation
+SYSTEM_PROMPT = f"""
 Objective: You are a smart, friendly virtual CSTU Chatbot Assistent, assisting students with their quires and assiting with knowing information on courses, International Students faqs, Locations, and Jobs.
 Procedure:
 1. Greet the student and inquire about their reason for contacting you.
@@ -193,8 +227,20 @@ Procedure to search data in the Pinecone index (cstu-bot):
 1. To retrieve course details, international student FAQs, locations, or jobs information, specify the metadata type (e.g., 'Course_Details').
 2. Use the Pinecone index 'cstu-bot' to query the relevant information based on the student's request.
 3. Retrieve and present the requested data to the student.
-"""}
-]
+"""
+
+# Prompt token budget per request: system prompt, conversation summary, recent turns and the new message
+MAX_PROMPT_TOKENS = int(os.environ.get("CSTU_MAX_PROMPT_TOKENS", 3000))
+
+# Maximum number of responses streaming from OpenAI at once, across all sessions
+MAX_CONCURRENT_RESPONSES = int(os.environ.get("CSTU_MAX_CONCURRENT_RESPONSES", 8))
+
+# Semantic response cache: question similarity needed for a hit, and how long answers stay valid (seconds)
+RESPONSE_CACHE_THRESHOLD = float(os.environ.get("CSTU_RESPONSE_CACHE_THRESHOLD", 0.95))
+RESPONSE_CACHE_TTL = float(os.environ.get("CSTU_RESPONSE_CACHE_TTL", 3600))
+
+# Minimum similarity between a question and a metadata type's centroid for the question to be routed to it
+ROUTER_THRESHOLD = float(os.environ.get("CSTU_ROUTER_THRESHOLD", 0.75))
 
 # Example user inputs for testing and debugging
 example_inputs = [
@@ -204,9 +250,19 @@ example_inputs = [
     "Are there any jobs available on campus?",  # Should match On_Campus_Jobs
 ]
 
-def get_embeddings(texts):
+# Sample questions added to the intent router's centroids alongside the documents themselves
+router_examples = [
+    ("Course_Details", "Tell me about the Python class"),
+    ("Course_Details", "Which courses or modules can I study?"),
+    ("On_Campus_Jobs", "Are there any jobs available on campus?"),
+    ("On_Campus_Jobs", "Can students work at the university?"),
+    ("Addresses", "Where is the university located?"),
+    ("Addresses", "What is the address of the nearest hospital?"),
+] + [("International_Students_faqs", doc['question']) for doc in json_data["International_Students_faqs"]]
+
+def create_embeddings(texts):
     """
-    Generate embeddings for a list of texts using OpenAI's embedding model.
+    Generate embeddings for a list of texts using OpenAI's embedding model, bypassing the cache.
     
     Args:
         texts (list): A list of strings to generate embeddings for.
@@ -215,53 +271,111 @@ def get_embeddings(texts):
         list: A list of embeddings corresponding to the input texts.
     """
     response = openai.Embedding.create(
-        model="text-embedding-ada-002",  # Use the appropriate embedding model
+        model=EMBEDDING_MODEL,  # Use the appropriate embedding model
         input=texts
     )
     return [embedding['embedding'] for embedding in response['data']]
 
-def upsert_data(index):
+# Cache of embeddings keyed by model and normalized text: an in-process LRU in front of SQLite
+embedding_cache = EmbeddingCache(create_embeddings, EMBEDDING_MODEL, EMBEDDING_CACHE_PATH)
+
+def get_embeddings(texts):
     """
-    Upsert data into the Pinecone index.
+    Generate embeddings for a list of texts, serving repeated texts from the embedding cache.
     
     Args:
-        index (pinecone.Index): The Pinecone index to upsert data into.
+        texts (list): A list of strings to generate embeddings for.
+    
+    Returns:
+        list: A list of embeddings corresponding to the input texts.
     """
-    for metadata_type, data in json_data.items():
-        vectors_to_upsert = []
+    with stage("embed"):
+        return embedding_cache(texts)
 
+def create_index():
+    """
+    Create the vector store selected by CSTU_VECTOR_BACKEND.
+    
+    Returns:
+        VectorStore: The local store (loaded from VECTOR_STORE_PATH if present) or the Pinecone 'cstu-bot' index.
+    """
+    if VECTOR_BACKEND == "pinecone":
+        return PineconeVectorStore(PINECONE_API_KEY, "cstu-bot")
+    return LocalVectorStore(VECTOR_STORE_PATH)
+
+# The vector index used for retrieval
+index = create_index()
+
+def iter_documents(data):
+    """
+    Turn the JSON data into documents for embedding.
+    
+    Args:
+        data (dict): The JSON data, keyed by metadata type.
+    
+    Yields:
+        Document: One (metadata_type, doc_id, text) tuple per record.
+    """
+    for metadata_type, records in data.items():
         if metadata_type == "Course_Details":
-            for doc in data:
-                text = doc['title'] + " " + doc['details']
-                doc_id = doc['code']
-                vectors_to_upsert.append((doc_id, text))
+            for doc in records:
+                yield Document(metadata_type, doc['code'], doc['title'] + " " + doc['details'])
 
         elif metadata_type == "International_Students_faqs":
-            for doc in data:
-                text = doc['answer']
-                doc_id = doc['question']
-                vectors_to_upsert.append((doc_id, text))
+            for doc in records:
+                yield Document(metadata_type, doc['question'], doc['answer'])
 
         elif metadata_type == "On_Campus_Jobs":
-            for doc in data:
-                text = doc['description']
-                doc_id = doc['job_title']
-                vectors_to_upsert.append((doc_id, text))
+            for doc in records:
+                yield Document(metadata_type, doc['job_title'], doc['description'])
 
         elif metadata_type == "Addresses":
-            for item in data:
-                text = item['name'] + " " + item['address']
-                doc_id = item['name']
-                vectors_to_upsert.append((doc_id, text))
+            for item in records:
+                yield Document(metadata_type, item['name'], item['name'] + " " + item['address'])
 
-        else:
-            continue  # Skip unrecognized metadata types
+        # Skip unrecognized metadata types
 
-        # Upsert vectors to Pinecone
-        for doc_id, text in vectors_to_upsert:
-            embedding = get_embeddings([text])[0]
-            index.upsert(vectors=[(doc_id, embedding, {"type": metadata_type, "text": text})])
-            print(f"Document '{doc_id}' from {metadata_type} has been upserted into Pinecone successfully.")
+def upsert_data(index, max_workers=4):
+    """
+    Upsert data into the vector index.
+    
+    Documents are embedded in batched, concurrent requests and upserted in bulk.
+    
+    Args:
+        index (VectorStore): The vector index to upsert data into.
+        max_workers (int): Maximum number of embedding requests in flight (default is 4).
+    
+    Returns:
+        IngestStats: Counters and throughput for the run.
+    """
+    stats = ingest_documents(index, iter_documents(json_data), get_embeddings,
+                             max_workers=max_workers, retry_on=RETRYABLE_ERRORS)
+    print(f"Upserted {stats.documents} documents into the index in {stats.batches} batches "
+          f"({stats.docs_per_sec:.1f} docs/sec, {stats.retries} retries).")
+    return stats
+
+def sync_data(index, max_workers=4):
+    """
+    Bring the vector index up to date with the JSON data.
+    
+    Only documents that are new, changed or were embedded with a different model are embedded
+    and upserted; documents removed from the JSON data are deleted from the index.
+    
+    Args:
+        index (VectorStore): The vector index to update.
+        max_workers (int): Maximum number of embedding requests in flight (default is 4).
+    
+    Returns:
+        SyncStats: Counts of unchanged, upserted and deleted documents.
+    """
+    stats = sync_documents(index, iter_documents(json_data), get_embeddings, MANIFEST_PATH, EMBEDDING_MODEL,
+                           max_workers=max_workers, retry_on=RETRYABLE_ERRORS)
+    print(f"Index sync: {stats.upserted} upserted, {stats.deleted} deleted, "
+          f"{stats.unchanged} unchanged ({stats.seconds:.2f}s).")
+    if stats.upserted or stats.deleted:
+        response_cache.clear()  # cached answers may be based on records that changed
+        reset_intent_router()
+    return stats
 
 def chat_complete_messages(messages, temperature=0.7):
     """
@@ -281,34 +395,130 @@ def chat_complete_messages(messages, temperature=0.7):
     )
     return completion.choices[0].message['content']
 
+async def stream_chat_completion(messages, temperature=0.7):
+    """
+    Start a streaming chat completion.
+    
+    Args:
+        messages (list): A list of message dictionaries in the format required by the OpenAI API.
+        temperature (float): The temperature setting for the model (default is 0.7).
+    
+    Returns:
+        async iterator: Completion chunks as they are generated.
+    """
+    return await openai.ChatCompletion.acreate(
+        model="gpt-4",
+        messages=messages,
+        temperature=temperature,
+        stream=True
+    )
+
+chat_streamer = ChatStreamer(stream_chat_completion, MAX_CONCURRENT_RESPONSES)
+
+# Answers to previously asked questions, reused when the question and its retrieved documents match
+response_cache = SemanticResponseCache(RESPONSE_CACHE_THRESHOLD, ttl=RESPONSE_CACHE_TTL)
+
 def get_relevant_info(index, query, metadata_type, top_k=5):
     """
-    Query the Pinecone index for relevant information based on the input query.
+    Query the vector index for relevant information based on the input query.
     
     Args:
-        index (pinecone.Index): The Pinecone index to query.
+        index (VectorStore): The vector index to query.
         query (str): The query string to search for.
-        metadata_type (str): The type of metadata to filter results by.
+        metadata_type (str): The type of metadata to search (the index namespace).
         top_k (int): The number of top results to return (default is 5).
     
     Returns:
-        list: A list of filtered query results matching the specified metadata type.
+        list: Up to top_k query results of the specified metadata type.
     """
     query_embedding = get_embeddings([query])[0]
 
-    query_result = index.query(
-        vector=query_embedding,
-        top_k=top_k,  # Number of top results to return
-        include_metadata=True
-    )
+    # Each metadata type lives in its own namespace, so the query only scores documents of that type
+    with stage("retrieve"):
+        query_result = index.query(
+            vector=query_embedding,
+            top_k=top_k,  # Number of top results to return
+            include_metadata=True,
+            namespace=metadata_type
+        )
 
-    # Filter results to ensure they match the metadata_type
-    filtered_results = [
-        match for match in query_result['matches']
-        if match['metadata']['type'] == metadata_type
-    ]
+    return list(query_result['matches'])
+
+def keyword_route(query):
+    """
+    Determine the type of information the user is requesting from keywords in the message.
+    
+    Kept as the baseline for the intent router benchmark (see bench_router.py).
+    
+    Args:
+        query (str): The user message.
+    
+    Returns:
+        str: The metadata type to search, or None if the message doesn't match a type.
+    """
+    query = query.lower()
+    if any(keyword in query for keyword in ["course", "class", "module", "study"]):
+        return "Course_Details"
+    elif any(keyword in query for keyword in ["faq", "fees", "payment", "international student"]):
+        return "International_Students_faqs"
+    elif any(keyword in query for keyword in ["location", "place", "map", "address"]):
+        return "Addresses"
+    elif any(keyword in query for keyword in ["job", "position", "work", "assistant"]):
+        return "On_Campus_Jobs"
+    return None
+
+_intent_router = None
+
+def get_intent_router():
+    """
+    Get the intent router, building it from the JSON data on first use.
+    
+    Returns:
+        CentroidRouter: Router with one centroid per metadata type.
+    """
+    global _intent_router
+    if _intent_router is None:
+        _intent_router = CentroidRouter.from_documents(
+            iter_documents(json_data), get_embeddings, ROUTER_THRESHOLD, examples=router_examples
+        )
+    return _intent_router
+
+def reset_intent_router():
+    """
+    Discard the intent router so it is rebuilt from the current data on next use.
+    """
+    global _intent_router
+    _intent_router = None
+
+def route_query(query):
+    """
+    Determine the type of information the user is requesting.
+    
+    Args:
+        query (str): The user message.
+    
+    Returns:
+        str: The metadata type to search, or None if no type is a confident match.
+    """
+    query_embedding = get_embeddings([query])[0]
+    with stage("route"):
+        metadata_type, _ = get_intent_router().route(query_embedding)
+    return metadata_type
 
-    return filtered_results
+def format_context(metadata_type, matches):
+    """
+    Format retrieved documents for inclusion in the prompt.
+    
+    Args:
+        metadata_type (str): The metadata type that was searched.
+        matches (list): Query results from get_relevant_info.
+    
+    Returns:
+        str: The context message content.
+    """
+    lines = [f"Relevant information from the CSTU database ({metadata_type}):"]
+    lines += [f"- {match['metadata']['text']}" for match in matches]
+    return "\n".join(lines)
 
 def chat_complete_messages_gr(text):
     """
@@ -345,52 +555,103 @@ def format_chat_prompt(message, chat_history):
     prompt = f"{prompt}\nUser: {message}\nAssistant:"
     return prompt
 
-def respond(message, chat_history):
+def summarize_turns(summary, turns):
     """
-    Generate a response to a user message and update the chat history.
+    Fold conversation turns that no longer fit in the prompt into the running summary.
+    
+    Args:
+        summary (str): The summary so far (may be empty).
+        turns (list): (user_message, assistant_message) tuples to add to the summary.
+    
+    Returns:
+        str: The updated summary.
+    """
+    transcript = "\n".join(f"User: {user_message}\nAssistant: {bot_message}" for user_message, bot_message in turns)
+    messages = [
+        {'role': 'system', 'content': "Update the summary of a conversation between a student and the CSTU Chatbot. "
+                                      "Keep facts the student shared (program, semester, questions asked) and answers "
+                                      "given. Reply with the summary only, in under 150 words."},
+        {'role': 'user', 'content': f"Current summary:\n{summary or '(none)'}\n\nNew turns:\n{transcript}"},
+    ]
+    return chat_complete_messages(messages, temperature=0)
+
+token_counter = TokenCounter("gpt-4")
+
+# One bounded conversation memory per chat session
+sessions = SessionStore(
+    lambda: ConversationMemory(SYSTEM_PROMPT, MAX_PROMPT_TOKENS, summarize_turns, token_counter)
+)
+
+async def respond(message, chat_history, request: gr.Request = None):
+    """
+    Generate a response to a user message, streaming it into the chat history as it arrives.
     
     Args:
         message (str): The current user message.
         chat_history (list): The chat history up to this point.
+        request (gr.Request): The Gradio request, used to find the user's session.
     
-    Returns:
-        tuple: An empty string and the updated chat history.
+    Yields:
+        tuple: An empty string and the chat history updated with the response so far.
     """
-    chatContext.append({'role': 'user', 'content': message})
-    response = chat_complete_messages(chatContext)
-    chat_history.append((message, response))
-    chatContext.append({'role': 'assistant', 'content': response})
-    return "", chat_history
+    session_id = request.session_hash if request is not None else "default"
+    memory = sessions.get(session_id)
+
+    # Ground questions about a known topic in the matching documents, and answer repeats from the cache.
+    # The cache is shared by all sessions, so only first questions use it: later answers depend on the
+    # session's history (e.g. the student's program and semester).
+    metadata_type = await asyncio.to_thread(route_query, message)
+    context, cache_key = None, None
+    if metadata_type:
+        matches = await asyncio.to_thread(get_relevant_info, index, message, metadata_type)
+        if matches:
+            context = format_context(metadata_type, matches)
+        if matches and memory.is_empty():
+            query_embedding = get_embeddings([message])[0]  # served from the embedding cache
+            cache_key = (query_embedding, context_fingerprint(matches))
+            cached = response_cache.lookup(*cache_key)
+            if cached is not None:
+                memory.add_turn(message, cached)
+                chat_history.append((message, cached))
+                print(f"Session {session_id}: answered from the response cache ({response_cache.stats()['hit_rate']:.0%} hit rate).")
+                yield "", chat_history
+                return
+
+    # May call the summarizer, which blocks, so keep it off the event loop
+    messages = await asyncio.to_thread(memory.build_messages, message, context)
+
+    chat_history.append((message, ""))
+    response = ""
+    timing = StreamTiming()
+    with stage("generate"):
+        async for token in chat_streamer.stream(messages, timing=timing):
+            response += token
+            chat_history[-1] = (message, response)
+            yield "", chat_history
+
+    memory.add_turn(message, response)
+    if cache_key is not None and response:
+        response_cache.store(*cache_key, response)
+    print(f"Session {session_id}: {memory.last_prompt_tokens} prompt tokens (budget {MAX_PROMPT_TOKENS}), {timing}.")
+    yield "", chat_history
 
 def main():
     """
     Main entry point of the app.
     """
-    pc = Pinecone(api_key=PINECONE_API_KEY)
-    index = pc.Index("cstu-bot")
-    
-    # Call the function to upsert data
-    upsert_data(index)
+    # Embed and upsert only the documents that changed since the last run
+    sync_data(index)
 
     # Test the examples
+    memory = sessions.get("examples")
     for example in example_inputs:
         print(f"User Input: {example}")
-        # Add user input to chat context
-        chatContext.append({'role': 'user', 'content': example})
 
         # Determine the type of information the user is requesting
-        metadata_type = None
-        if any(keyword in example.lower() for keyword in ["course", "class", "module", "study"]):
-            metadata_type = "Course_Details"
-        elif any(keyword in example.lower() for keyword in ["faq", "fees", "payment", "international student"]):
-            metadata_type = "International_Students_faqs"
-        elif any(keyword in example.lower() for keyword in ["location", "place", "map", "address"]):
-            metadata_type = "Addresses"
-        elif any(keyword in example.lower() for keyword in ["job", "position", "work", "assistant"]):
-            metadata_type = "On_Campus_Jobs"
+        metadata_type = route_query(example)
 
         if metadata_type:
-            # Query Pinecone for nearest neighbors based on user input
+            # Query the index for nearest neighbors based on user input
             query_results = get_relevant_info(index, example, metadata_type)
 
             if query_results:
@@ -401,23 +662,22 @@ def main():
                 response_message_content = f"I'm sorry, I couldn't find any relevant information about {metadata_type}."
         else:
             # Use OpenAI to generate responses if the type is not recognized
-            response_message_content = chat_complete_messages(chatContext)
+            response_message_content = chat_complete_messages(memory.build_messages(example))
 
         print("ChatBot: ", response_message_content)
-        chatContext.append({'role': 'assistant', 'content': response_message_content})
+        memory.add_turn(example, response_message_content)
 
     # Main chatbot loop (for interactive use)
     print("Welcome! I'm here to assist you with information about courses, International Students FAQs, locations, and jobs.")
 
-    def on_clear():
+    def on_clear(request: gr.Request):
         """
-        Clear the chat history.
+        Clear the chat history and the session's conversation memory.
         
         Returns:
             tuple: An empty value update for the message input and an empty list for the chat history.
         """
-        global chat_history
-        chat_history = []
+        sessions.reset(request.session_hash)
         return gr.update(value=""), []
 
     with gr.Blocks() as myDemo:
@@ -426,8 +686,9 @@ def main():
         btn = gr.Button("Send")
         clear = gr.ClearButton(components=[msg, chatbot], value="Clear console")
 
-        btn.click(respond, inputs=[msg, chatbot], outputs=[msg, chatbot])
-        msg.submit(respond, inputs=[msg, chatbot], outputs=[msg, chatbot])  # Press enter to submit
+        # Concurrency is limited by chat_streamer; let Gradio run sessions' events side by side
+        btn.click(respond, inputs=[msg, chatbot], outputs=[msg, chatbot], concurrency_limit=None)
+        msg.submit(respond, inputs=[msg, chatbot], outputs=[msg, chatbot], concurrency_limit=None)  # Press enter to submit
         clear.click(on_clear, outputs=[msg, chatbot])
 
     myDemo.launch(share=True, inbrowser=True)
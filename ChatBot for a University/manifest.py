@@ -0,0 +1,143 @@
+"""
+
+Incremental re-indexing for the CSTU Chatbot.
+
+- Manifest: a JSON file recording, for every indexed document, its metadata type, id, content hash and the
+  embedding model that produced its vector.
+- Sync: on startup the current documents are diffed against the manifest, so only new or changed documents
+  are embedded and upserted, and documents that no longer exist are deleted from the index.
+
+Delete the manifest file to force a full re-index.
+
+"""
+
+import hashlib
+import json
+import os
+import time
+from collections import namedtuple
+
+from ingestion import ingest_documents
+
+MANIFEST_VERSION = 2  # version 2 stores each metadata type in its own index namespace
+
+SyncStats = namedtuple("SyncStats", ["unchanged", "upserted", "deleted", "ingest", "seconds"])
+
+
+def content_hash(text):
+    """
+    Hash a document's text.
+
+    Args:
+        text (str): The text that gets embedded.
+
+    Returns:
+        str: Hex SHA-256 digest of the text.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class IndexManifest:
+    """
+    Record of what is currently in the index, keyed by (metadata_type, doc_id).
+
+    Args:
+        path (str): Location of the JSON manifest file. A missing file means an empty index.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.version = None  # version of the saved manifest, None if there is none
+        if os.path.isfile(path):
+            with open(path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            self.version = saved.get("version", 1)
+            if self.version == MANIFEST_VERSION:
+                self.entries = {
+                    (entry["type"], entry["doc_id"]): (entry["hash"], entry["model"])
+                    for entry in saved["entries"]
+                }
+
+    def diff(self, documents, model):
+        """
+        Compare documents against the manifest.
+
+        Args:
+            documents (iterable): Document tuples currently in the data.
+            model (str): Name of the embedding model in use.
+
+        Returns:
+            tuple: Documents that are new or changed (including those embedded with another model),
+                keys of manifest entries whose document no longer exists, and the number of unchanged documents.
+        """
+        changed, seen, unchanged = [], set(), 0
+        for doc in documents:
+            key = (doc.metadata_type, doc.doc_id)
+            seen.add(key)
+            if self.entries.get(key) == (content_hash(doc.text), model):
+                unchanged += 1
+            else:
+                changed.append(doc)
+        deleted = [key for key in self.entries if key not in seen]
+        return changed, deleted, unchanged
+
+    def update(self, upserted, deleted, model):
+        for doc in upserted:
+            self.entries[(doc.metadata_type, doc.doc_id)] = (content_hash(doc.text), model)
+        for key in deleted:
+            self.entries.pop(key, None)
+
+    def save(self):
+        entries = [
+            {"type": metadata_type, "doc_id": doc_id, "hash": digest, "model": model}
+            for (metadata_type, doc_id), (digest, model) in sorted(self.entries.items())
+        ]
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "entries": entries}, f, indent=1)
+        os.replace(tmp_path, self.path)  # atomic, so a crash never leaves a half-written manifest
+
+
+def sync_documents(index, documents, embed_fn, manifest_path, model, **ingest_kwargs):
+    """
+    Bring the index in line with the documents, touching only what changed since the last sync.
+
+    The manifest is saved only after the index has been updated, so an interrupted sync is
+    simply redone on the next start.
+
+    Args:
+        index (VectorStore): The vector store to update.
+        documents (iterable): Document tuples currently in the data.
+        embed_fn (callable): Function mapping a list of texts to a list of embeddings.
+        manifest_path (str): Location of the JSON manifest file.
+        model (str): Name of the embedding model used by embed_fn.
+        **ingest_kwargs: Passed through to ingestion.ingest_documents.
+
+    Returns:
+        SyncStats: Counts of unchanged, upserted and deleted documents, the ingestion stats
+            (None if nothing needed embedding) and the elapsed time.
+    """
+    start = time.perf_counter()
+    manifest = IndexManifest(manifest_path)
+    changed, deleted, unchanged = manifest.diff(documents, model)
+
+    # Version 1 kept every document in the default namespace. Its entries are ignored, so everything is
+    # re-ingested into per-type namespaces below; drop the old copies so they don't linger as orphans.
+    migrated = manifest.version is not None and manifest.version < 2
+    if migrated:
+        index.delete_namespace("")
+
+    ingest_stats = ingest_documents(index, changed, embed_fn, **ingest_kwargs) if changed else None
+    stale_ids = {}
+    for metadata_type, doc_id in deleted:
+        stale_ids.setdefault(metadata_type, []).append(doc_id)
+    for metadata_type, ids in stale_ids.items():
+        index.delete(ids=ids, namespace=metadata_type)
+
+    if changed or deleted or migrated:
+        index.save()  # persist the index before the manifest claims it is up to date
+        manifest.update(changed, deleted, model)
+        manifest.save()
+
+    return SyncStats(unchanged, len(changed), len(deleted), ingest_stats, time.perf_counter() - start)
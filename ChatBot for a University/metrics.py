@@ -0,0 +1,52 @@
+"""
+
+Per-request stage timing for the CSTU Chatbot.
+
+- Stages: code on the request path wraps its expensive steps (embed, retrieve, generate) in stage(name).
+- Requests: track_request() collects the time spent in each stage by the current request. Timings are kept in a
+  context variable, so concurrent requests on the event loop and their worker threads don't mix.
+
+Outside track_request(), stage() costs nothing more than a context variable lookup.
+
+"""
+
+import contextvars
+import time
+from contextlib import contextmanager
+
+_request_stages = contextvars.ContextVar("request_stages", default=None)
+
+
+@contextmanager
+def stage(name):
+    """
+    Add the time spent in the block to the named stage of the current request.
+
+    Args:
+        name (str): Stage name, e.g. 'embed', 'retrieve' or 'generate'.
+    """
+    stages = _request_stages.get()
+    if stages is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages[name] = stages.get(name, 0.0) + time.perf_counter() - start
+
+
+@contextmanager
+def track_request():
+    """
+    Collect stage timings for the code run inside the block.
+
+    Yields:
+        dict: Seconds spent per stage name, filled in as the request runs.
+    """
+    stages = {}
+    token = _request_stages.set(stages)
+    try:
+        yield stages
+    finally:
+        _request_stages.reset(token)
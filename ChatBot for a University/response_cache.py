@@ -0,0 +1,137 @@
+"""
+
+Semantic response cache for the CSTU Chatbot.
+
+- Similarity Lookup: a new question is compared against the embeddings of previously answered questions in one
+  vectorized pass; the best match above a cosine similarity threshold is a candidate hit.
+- Context Check: a candidate is only returned if the documents retrieved for the new question are the same,
+  with the same content, as those the cached answer was generated from.
+- Eviction: entries expire after a TTL, and the least recently used entry is evicted when the cache is full.
+- Invalidation: clear() drops every entry, e.g. when the indexed data changes.
+
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def context_fingerprint(matches):
+    """
+    Fingerprint the documents an answer is grounded in.
+
+    Args:
+        matches (list): Query matches with 'id' and 'metadata' ('type' and 'text').
+
+    Returns:
+        str: Hex digest identifying the set of documents and their content.
+    """
+    digest = hashlib.sha256()
+    for match in sorted(matches, key=lambda match: (match['metadata']['type'], match['id'])):
+        for part in (match['metadata']['type'], match['id'], match['metadata']['text']):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class SemanticResponseCache:
+    """
+    Answers keyed by question embedding and retrieved context.
+
+    Args:
+        threshold (float): Minimum cosine similarity between questions for a hit.
+        max_entries (int): Maximum number of cached answers.
+        ttl (float): Seconds an answer stays valid.
+        clock (callable): Time source, in seconds.
+    """
+
+    def __init__(self, threshold=0.95, max_entries=1000, ttl=3600, clock=time.monotonic):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = self.misses = 0
+        self._entries = OrderedDict()  # entry id -> (unit vector, context key, answer, created)
+        self._next_id = 0
+        self._matrix = None  # stacked vectors of _entries, rebuilt lazily after changes
+        self._matrix_ids = []
+        self._lock = threading.Lock()
+
+    def lookup(self, vector, context_key):
+        """
+        Find a cached answer for a question.
+
+        Args:
+            vector (list): Embedding of the question.
+            context_key (str): Fingerprint of the documents retrieved for the question.
+
+        Returns:
+            str: The cached answer, or None on a miss.
+        """
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        with self._lock:
+            self._expire()
+            if self._entries:
+                if self._matrix is None:
+                    self._matrix_ids = list(self._entries)
+                    self._matrix = np.stack([self._entries[entry_id][0] for entry_id in self._matrix_ids])
+                similarities = self._matrix @ query
+                for position in np.argsort(-similarities):
+                    if similarities[position] < self.threshold:
+                        break
+                    entry_id = self._matrix_ids[position]
+                    _, entry_context, answer, _ = self._entries[entry_id]
+                    if entry_context == context_key:
+                        self._entries.move_to_end(entry_id)
+                        self.hits += 1
+                        return answer
+            self.misses += 1
+            return None
+
+    def store(self, vector, context_key, answer):
+        """
+        Cache an answer.
+
+        Args:
+            vector (list): Embedding of the question.
+            context_key (str): Fingerprint of the documents the answer was generated from.
+            answer (str): The answer.
+        """
+        unit = np.asarray(vector, dtype=np.float32)
+        unit = unit / (np.linalg.norm(unit) or 1.0)
+        with self._lock:
+            self._entries[self._next_id] = (unit, context_key, answer, self.clock())
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _expire(self):
+        cutoff = self.clock() - self.ttl
+        expired = [entry_id for entry_id, entry in self._entries.items() if entry[3] < cutoff]
+        for entry_id in expired:
+            del self._entries[entry_id]
+        if expired:
+            self._matrix = None
@@ -0,0 +1,76 @@
+"""
+
+Streaming chat completions for the CSTU Chatbot.
+
+- Streaming: completion tokens are yielded as they arrive, so the UI can render a partial answer.
+- Concurrency Limit: an asyncio semaphore caps the number of completions streaming at once; further requests
+  wait their turn instead of piling onto the API.
+- Timing: every stream records its queue wait, time to first token, total time and token count.
+
+"""
+
+import asyncio
+import time
+
+
+class StreamTiming:
+    """
+    Timings for one streamed completion, filled in as the stream is consumed.
+    """
+
+    def __init__(self):
+        self.queued = 0.0  # seconds spent waiting for a concurrency slot
+        self.first_token = None  # seconds from the request until the first token
+        self.total = 0.0  # seconds from the request until the stream ended
+        self.tokens = 0
+
+    def __repr__(self):
+        first_token = "n/a" if self.first_token is None else "%.0fms" % (self.first_token * 1000)
+        return "queued %.0fms, first token %s, %d tokens in %.0fms" % (
+            self.queued * 1000, first_token, self.tokens, self.total * 1000)
+
+
+class ChatStreamer:
+    """
+    Stream chat completions with bounded concurrency.
+
+    Args:
+        stream_fn (callable): Coroutine function (messages, temperature) returning an async iterator of
+            completion chunks in the OpenAI streaming format.
+        max_concurrency (int): Maximum number of completions streaming at once.
+    """
+
+    def __init__(self, stream_fn, max_concurrency=8):
+        self.stream_fn = stream_fn
+        self.max_concurrency = max_concurrency
+        self._semaphore = None
+
+    async def stream(self, messages, temperature=0.7, timing=None):
+        """
+        Yield the completion for the messages token by token.
+
+        Args:
+            messages (list): Messages for the chat completion API.
+            temperature (float): The temperature setting for the model.
+            timing (StreamTiming): Optional object to record this stream's timings in.
+
+        Yields:
+            str: Pieces of the response content as they arrive.
+        """
+        if self._semaphore is None:  # created lazily so it binds to the running event loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        timing = timing if timing is not None else StreamTiming()
+        start = time.perf_counter()
+        async with self._semaphore:
+            timing.queued = time.perf_counter() - start
+            try:
+                async for chunk in await self.stream_fn(messages, temperature):
+                    content = chunk['choices'][0]['delta'].get('content')
+                    if not content:
+                        continue
+                    if timing.first_token is None:
+                        timing.first_token = time.perf_counter() - start
+                    timing.tokens += 1
+                    yield content
+            finally:
+                timing.total = time.perf_counter() - start
@@ -0,0 +1,349 @@
+"""
+
+Vector stores for the CSTU Chatbot.
+
+- VectorStore: the interface the chatbot uses, shaped like Pinecone's Index (upsert, query, delete), including
+  namespaces. The chatbot keeps each metadata type in its own namespace, so a typed query only ever scores
+  vectors of that type.
+- LocalVectorStore: an in-process store holding one partition per namespace, each a matrix of unit-normalized
+  float32 vectors. Queries are batched dot products with top-k selection; partitions above a size threshold are
+  searched through an inverted file (IVF) index built with k-means. Partitions persist to .npy files that are
+  memory-mapped on load.
+- PineconeVectorStore: the remote 'cstu-bot' Pinecone index behind the same interface.
+
+"""
+
+import json
+import os
+import uuid
+
+import numpy as np
+
+INDEX_FILE = "index.json"
+# Files of the single-matrix layout used before namespaces, removed on save
+LEGACY_FILES = ("vectors.npy", "metadata.json")
+
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _top_k(scores, k):
+    """
+    Select the k highest scores in each row, best first.
+
+    Args:
+        scores (np.ndarray): (n_queries, n_candidates) score matrix.
+        k (int): Number of results per row.
+
+    Returns:
+        tuple: (n_queries, k) arrays of column indices and scores.
+    """
+    k = min(k, scores.shape[1])
+    if k < scores.shape[1]:
+        columns = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        columns = np.broadcast_to(np.arange(k), scores.shape).copy()
+    top_scores = np.take_along_axis(scores, columns, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind="stable")
+    return np.take_along_axis(columns, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+
+class VectorStore:
+    """
+    Interface shared by the vector store backends. Vectors are (id, values, metadata) tuples, ids are unique
+    within a namespace, and query results are dictionaries with a 'matches' list of {'id', 'score', 'metadata'}
+    dictionaries.
+    """
+
+    def upsert(self, vectors, namespace=""):
+        raise NotImplementedError
+
+    def query(self, vector, top_k=5, include_metadata=False, namespace=""):
+        raise NotImplementedError
+
+    def delete(self, ids, namespace=""):
+        raise NotImplementedError
+
+    def delete_namespace(self, namespace=""):
+        """
+        Delete every vector in a namespace. Deleting a namespace that does not exist is not an error.
+        """
+        raise NotImplementedError
+
+    def save(self):
+        """
+        Persist the store. A no-op for backends that persist on every write.
+        """
+
+
+class _Partition:
+    """
+    Dense matrix of the vectors in one namespace, with their ids and metadata.
+    """
+
+    def __init__(self, matrix=None, ids=(), metadata=()):
+        self.matrix = np.zeros((0, 0), dtype=np.float32) if matrix is None else matrix
+        self.size = self.matrix.shape[0]
+        self.ids = list(ids)
+        self.metadata = list(metadata)
+        self.rows = {vector_id: row for row, vector_id in enumerate(self.ids)}
+        self.ivf = None
+        self.file = None  # .npy file holding the current vectors, None once they change
+
+    @property
+    def vectors(self):
+        return self.matrix[:self.size]
+
+    def upsert(self, vectors):
+        values = _normalize(np.asarray([item[1] for item in vectors], dtype=np.float32))
+        if self.matrix.shape[1] == 0:
+            self.matrix = np.zeros((0, values.shape[1]), dtype=np.float32)
+        elif values.shape[1] != self.matrix.shape[1]:
+            raise ValueError(
+                "Vector dimension {} does not match store dimension {}".format(values.shape[1], self.matrix.shape[1])
+            )
+
+        self._reserve(self.size + len(vectors))
+        for (vector_id, _, metadata), row_values in zip(vectors, values):
+            row = self.rows.get(vector_id)
+            if row is None:
+                row = self.size
+                self.rows[vector_id] = row
+                self.ids.append(vector_id)
+                self.metadata.append(dict(metadata))
+                self.size += 1
+            else:
+                self.metadata[row] = dict(metadata)
+            self.matrix[row] = row_values
+        self.ivf = None
+        self.file = None
+
+    def delete(self, ids):
+        self._reserve(self.size)
+        for vector_id in ids:
+            row = self.rows.pop(vector_id, None)
+            if row is None:
+                continue
+            # Move the last row into the hole so the matrix stays dense
+            last = self.size - 1
+            if row != last:
+                self.matrix[row] = self.matrix[last]
+                self.ids[row] = self.ids[last]
+                self.metadata[row] = self.metadata[last]
+                self.rows[self.ids[row]] = row
+            self.ids.pop()
+            self.metadata.pop()
+            self.size -= 1
+        self.ivf = None
+        self.file = None
+
+    def _reserve(self, size):
+        """
+        Make the matrix writable with room for `size` rows, growing geometrically.
+        """
+        capacity = self.matrix.shape[0]
+        if size > capacity or isinstance(self.matrix, np.memmap):
+            grown = np.zeros((max(size, 2 * capacity, 16), self.matrix.shape[1]), dtype=np.float32)
+            grown[:self.size] = self.matrix[:self.size]
+            self.matrix = grown
+
+    def build_ivf(self, n_lists=None, iterations=10, sample_size=256, chunk_size=65536):
+        """
+        Cluster the vectors with spherical k-means and bucket them by nearest centroid.
+        """
+        data = self.vectors
+        n_lists = min(n_lists or int(np.sqrt(self.size)), self.size)
+        rng = np.random.default_rng(0)
+        sample = data[np.sort(rng.choice(self.size, min(self.size, sample_size * n_lists), replace=False))]
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            empty = ~sums.any(axis=1)
+            sums[empty] = centroids[empty]
+            centroids = _normalize(sums)
+
+        assignment = np.concatenate([
+            np.argmax(data[start:start + chunk_size] @ centroids.T, axis=1)
+            for start in range(0, self.size, chunk_size)
+        ])
+        order = np.argsort(assignment, kind="stable")
+        offsets = np.searchsorted(assignment[order], np.arange(n_lists + 1))
+        self.ivf = (centroids, order, offsets)
+
+    def ivf_search(self, queries, top_k, n_probe):
+        """
+        Scan the n_probe lists nearest to each query, and further lists in order until they hold top_k vectors.
+        """
+        centroids, order, offsets = self.ivf
+        top_k = min(top_k, self.size)
+        list_order = np.argsort(-(queries @ centroids.T), axis=1, kind="stable")
+        sizes = np.diff(offsets)
+
+        rows = np.zeros((len(queries), top_k), dtype=np.int64)
+        scores = np.zeros((len(queries), top_k), dtype=np.float32)
+        for i, (query, lists) in enumerate(zip(queries, list_order)):
+            n_lists = max(n_probe, int(np.searchsorted(np.cumsum(sizes[lists]), top_k)) + 1)
+            candidates = np.concatenate([order[offsets[c]:offsets[c + 1]] for c in lists[:n_lists]])
+            columns, candidate_scores = _top_k((self.vectors[candidates] @ query)[np.newaxis, :], top_k)
+            rows[i] = candidates[columns[0]]
+            scores[i] = candidate_scores[0]
+        return rows, scores
+
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process vector store using cosine similarity, with one partition per namespace.
+
+    Args:
+        path (str): Directory to persist to and load from, or None for a memory-only store.
+        approximate_threshold (int): Partition size from which queries go through the IVF index
+            instead of an exact scan.
+        n_lists (int): Number of IVF clusters (default is the square root of the partition size).
+        n_probe (int): Number of IVF clusters scanned per query.
+    """
+
+    def __init__(self, path=None, approximate_threshold=50000, n_lists=None, n_probe=8):
+        self.path = path
+        self.approximate_threshold = approximate_threshold
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self._partitions = {}
+        if path is not None and os.path.isfile(os.path.join(path, INDEX_FILE)):
+            self._load()
+
+    def __len__(self):
+        return sum(partition.size for partition in self._partitions.values())
+
+    def namespaces(self):
+        return {namespace: partition.size for namespace, partition in self._partitions.items() if partition.size}
+
+    def upsert(self, vectors, namespace=""):
+        vectors = [item if len(item) == 3 else (item[0], item[1], {}) for item in vectors]
+        if vectors:
+            self._partitions.setdefault(namespace, _Partition()).upsert(vectors)
+        return {"upserted_count": len(vectors)}
+
+    def delete(self, ids, namespace=""):
+        partition = self._partitions.get(namespace)
+        if partition is not None and partition.size:
+            partition.delete(ids)
+
+    def delete_namespace(self, namespace=""):
+        self._partitions.pop(namespace, None)
+
+    def query(self, vector, top_k=5, include_metadata=False, namespace=""):
+        return self.query_batch([vector], top_k, include_metadata, namespace)[0]
+
+    def query_batch(self, vectors, top_k=5, include_metadata=False, namespace=""):
+        """
+        Find the nearest stored vectors in a namespace for several query vectors at once.
+
+        Args:
+            vectors (list): Query vectors.
+            top_k (int): Number of matches per query.
+            include_metadata (bool): Whether to include each match's metadata.
+            namespace (str): The namespace to search.
+
+        Returns:
+            list: One {'matches': [...]} result per query vector.
+        """
+        queries = _normalize(np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1))
+        partition = self._partitions.get(namespace)
+        if partition is None or partition.size == 0:
+            return [{"matches": []} for _ in range(len(queries))]
+
+        if partition.size >= self.approximate_threshold:
+            if partition.ivf is None:
+                partition.build_ivf(self.n_lists)
+            rows, scores = partition.ivf_search(queries, top_k, self.n_probe)
+        else:
+            rows, scores = _top_k(queries @ partition.vectors.T, top_k)
+
+        results = []
+        for query_rows, query_scores in zip(rows, scores):
+            matches = []
+            for row, score in zip(query_rows.tolist(), query_scores.tolist()):
+                match = {"id": partition.ids[row], "score": score}
+                if include_metadata:
+                    match["metadata"] = partition.metadata[row]
+                matches.append(match)
+            results.append({"matches": matches})
+        return results
+
+    def save(self):
+        if self.path is None:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        saved = {}
+        for namespace, partition in sorted(self._partitions.items()):
+            if partition.size == 0:
+                continue
+            if partition.file is None:
+                # Always a new file: the old one may still be memory-mapped, and can't be replaced on Windows
+                filename = "vectors-{}.npy".format(uuid.uuid4().hex[:16])
+                with open(os.path.join(self.path, filename + ".tmp"), "wb") as f:
+                    np.save(f, np.ascontiguousarray(partition.vectors))
+                os.replace(os.path.join(self.path, filename + ".tmp"), os.path.join(self.path, filename))
+                partition.file = filename
+            saved[namespace] = {"file": partition.file, "ids": partition.ids, "metadata": partition.metadata}
+
+        index_path = os.path.join(self.path, INDEX_FILE)
+        with open(index_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"namespaces": saved}, f)
+        os.replace(index_path + ".tmp", index_path)
+
+        # Remove vector files the index no longer refers to (deleted or rewritten namespaces, the old layout)
+        referenced = {entry["file"] for entry in saved.values()}
+        for filename in os.listdir(self.path):
+            stale = filename in LEGACY_FILES or (filename.startswith("vectors-") and filename.endswith(".npy"))
+            if stale and filename not in referenced:
+                try:
+                    os.remove(os.path.join(self.path, filename))
+                except OSError:  # still memory-mapped on Windows; removed by a later save
+                    pass
+
+    def _load(self):
+        with open(os.path.join(self.path, INDEX_FILE), "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        for namespace, entry in saved["namespaces"].items():
+            matrix = np.load(os.path.join(self.path, entry["file"]), mmap_mode="r")
+            self._partitions[namespace] = _Partition(matrix, entry["ids"], entry["metadata"])
+            self._partitions[namespace].file = entry["file"]
+
+
+class PineconeVectorStore(VectorStore):
+    """
+    Remote Pinecone index behind the VectorStore interface.
+
+    Args:
+        api_key (str): Pinecone API key.
+        index_name (str): Name of the Pinecone index.
+    """
+
+    def __init__(self, api_key, index_name):
+        from pinecone import Pinecone
+
+        self.index = Pinecone(api_key=api_key).Index(index_name)
+
+    def upsert(self, vectors, namespace=""):
+        return self.index.upsert(vectors=vectors, namespace=namespace)
+
+    def query(self, vector, top_k=5, include_metadata=False, namespace=""):
+        return self.index.query(vector=vector, top_k=top_k, include_metadata=include_metadata, namespace=namespace)
+
+    def delete(self, ids, namespace=""):
+        return self.index.delete(ids=ids, namespace=namespace)
+
+    def delete_namespace(self, namespace=""):
+        from pinecone.exceptions import NotFoundException
+
+        try:
+            self.index.delete(delete_all=True, namespace=namespace)
+        except NotFoundException:  # the namespace is already empty
+            pass
@@ -0,0 +1,393 @@
+"""Measure acoustic properties of voice recordings, without R.
+
+A NumPy port of specan3 in getAttributes.r, which combines seewave's spec/specprop, fund and dfreq. Frames are
+strided views of the signal and every frame's FFT is taken in one call.
+"""
+import os
+import subprocess
+import sys
+import warnings
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.io import wavfile
+
+# Features in the order of voice.csv
+FEATURES = ('meanfreq', 'sd', 'median', 'Q25', 'Q75', 'IQR', 'skew', 'kurt', 'sp.ent', 'sfm', 'mode', 'centroid',
+            'meanfun', 'minfun', 'maxfun', 'meandom', 'mindom', 'maxdom', 'dfrange', 'modindx')
+
+
+def read_wav(filename, start=0, end=20):
+    """
+    Read part of a WAVE file.
+
+    :param filename: Name of file.
+    :param start: Start of the selection in seconds.
+    :param end: End of the selection in seconds.
+    :return: First channel as float64 (integer samples scaled to the 16 bit range), sampling rate.
+    """
+    try:
+        rate, signal = wavfile.read(filename, mmap=True)  # only the selection is read from disk
+    except ValueError:  # 24 bit files can't be memory-mapped
+        rate, signal = wavfile.read(filename)
+    if signal.ndim > 1:
+        signal = signal[:, 0]
+    selection = np.asarray(signal[int(start * rate):int(end * rate)], dtype=np.float64)
+    if signal.dtype == np.uint8:  # 8 bit WAVE samples are unsigned
+        return (selection - 128) * 256, rate
+    if np.issubdtype(signal.dtype, np.integer) and signal.dtype != np.int16:
+        return selection * (32768 / (np.iinfo(signal.dtype).max + 1)), rate
+    return selection, rate
+
+
+def afilter(signal, threshold=5):
+    """
+    Zero every sample below a percentage of the maximum amplitude (seewave afilter).
+
+    :param signal: Signal.
+    :param threshold: Amplitude threshold in percent.
+    :return: Filtered signal.
+    """
+    return np.where(np.abs(signal) <= np.abs(signal).max() * threshold / 100, 0.0, signal)
+
+
+def spectral_properties(signal, rate, flim=(0, .28)):
+    """
+    Statistics of the mean frequency spectrum (seewave spec then specprop).
+
+    :param signal: Signal.
+    :param rate: Sampling rate.
+    :param flim: Frequency band in kHz.
+    :return: Dict of meanfreq, sd, median, Q25, Q75, IQR, skew, kurt, sp.ent, sfm, mode and centroid, in kHz.
+    """
+    n = len(signal)
+    return spectrum_properties(np.abs(np.fft.rfft(signal * np.hanning(n)))[:n // 2], rate, flim)
+
+
+def spectrum_properties(spectrum, rate, flim=(0, .28)):
+    """
+    Statistics of a magnitude spectrum (seewave specprop).
+
+    :param spectrum: Magnitudes of the frequency bins from 0 up to (not including) half the sampling rate.
+    :param rate: Sampling rate.
+    :param flim: Frequency band in kHz.
+    :return: Dict of meanfreq, sd, median, Q25, Q75, IQR, skew, kurt, sp.ent, sfm, mode and centroid, in kHz.
+    """
+    spectrum = spectrum / spectrum.max()
+
+    size = len(spectrum)
+    spectrum = spectrum[int(flim[0] * 1000 * size / (rate / 2)):int(flim[1] * 1000 * size / (rate / 2))]
+    size = len(spectrum)
+    freq = np.linspace(flim[0] * 1000, flim[1] * 1000, size)
+
+    amp = spectrum / spectrum.sum()
+    cumamp = np.cumsum(amp)
+    mean = np.sum(amp * freq)
+    sd = np.sqrt(np.sum(amp * (freq - mean) ** 2))
+
+    def quantile(q):
+        return freq[min(np.count_nonzero(cumamp <= q), size - 1)]
+
+    median, q25, q75 = quantile(.5), quantile(.25), quantile(.75)
+
+    # seewave's skewness and kurtosis are of the amplitude values, not of the frequency distribution
+    z = amp - amp.mean()
+    w = amp.std(ddof=1)
+    skew = np.sum(z ** 3) / (size - 1) / w ** 3
+    kurt = np.sum(z ** 4) / (size - 1) / w ** 4
+
+    nonzero = amp[amp > 0]
+    entropy = -np.sum(nonzero * np.log(nonzero)) / np.log(size)
+    flat = np.where(spectrum == 0, 1e-5, spectrum)
+    sfm = np.exp(np.mean(np.log(flat))) / flat.mean()
+
+    return {'meanfreq': mean / 1000, 'sd': sd / 1000, 'median': median / 1000, 'Q25': q25 / 1000,
+            'Q75': q75 / 1000, 'IQR': (q75 - q25) / 1000, 'skew': skew, 'kurt': kurt, 'sp.ent': entropy,
+            'sfm': sfm, 'mode': freq[np.argmax(amp)] / 1000, 'centroid': mean / 1000}
+
+
+def fundamental(signal, rate, wl=2048, ovlp=50, threshold=5, fmax=280):
+    """
+    Fundamental frequency track from the real cepstrum of each frame (seewave fund).
+
+    :param signal: Signal.
+    :param rate: Sampling rate.
+    :param wl: Frame length.
+    :param ovlp: Frame overlap in percent.
+    :param threshold: Amplitude threshold in percent (see afilter).
+    :param fmax: Highest fundamental frequency in Hz.
+    :return: Fundamental frequency of each frame in kHz, NaN where none was found.
+    """
+    signal = afilter(signal, threshold)
+    if len(signal) < wl:
+        return np.array([])
+    return cepstral_fundamental(sliding_window_view(signal, wl)[::int(wl - ovlp * wl / 100)], rate, fmax)
+
+
+def cepstral_fundamental(frames, rate, fmax=280):
+    """
+    Fundamental frequency of each frame from its real cepstrum.
+
+    :param frames: (n_frames, frame length) array.
+    :param rate: Sampling rate.
+    :param fmax: Highest fundamental frequency in Hz.
+    :return: Fundamental frequency of each frame in kHz, NaN where none was found.
+    """
+    wl = frames.shape[1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cepstrum = np.fft.irfft(np.log(np.abs(np.fft.rfft(frames, axis=1))), n=wl, axis=1)[:, :wl // 2]
+    cepstrum[~np.isfinite(cepstrum)] = 0
+
+    # seewave searches from quefrency f/fmax and converts with the unrounded value (157.5 at 44.1 kHz)
+    lowest = rate / fmax
+    position = np.argmax(cepstrum[:, int(lowest):], axis=1)
+    return np.where(position == 0, np.nan, rate / (position + lowest) / 1000)
+
+
+def dominant(signal, rate, wl=2048, threshold=5, bandpass=(0, 22)):
+    """
+    Dominant frequency track: the loudest bin of each frame of the spectrogram (seewave dfreq).
+
+    :param signal: Signal.
+    :param rate: Sampling rate.
+    :param wl: Frame length, frames do not overlap.
+    :param threshold: Amplitude threshold in percent (see afilter).
+    :param bandpass: Frequency band in kHz.
+    :return: Dominant frequency of each frame in kHz, NaN for silent frames.
+    """
+    signal = afilter(signal, threshold)
+    if len(signal) <= wl:
+        return np.array([])
+    return dominant_frequency(sliding_window_view(signal[:-1], wl)[::wl], rate, bandpass)
+
+
+def dominant_frequency(frames, rate, bandpass=(0, 22)):
+    """
+    Loudest frequency of each frame within a band.
+
+    :param frames: (n_frames, frame length) array.
+    :param rate: Sampling rate.
+    :param bandpass: Frequency band in kHz.
+    :return: Dominant frequency of each frame in kHz, NaN for silent frames.
+    """
+    wl = frames.shape[1]
+    spectrogram = np.abs(np.fft.rfft(frames * np.hanning(wl), axis=1))[:, :wl // 2]
+
+    high = min(bandpass[1], np.ceil(rate / 2000) - 1)  # the band can't go above the Nyquist frequency
+    low_bin, high_bin = round(wl * bandpass[0] * 1000 / rate), round(wl * high * 1000 / rate)
+    spectrogram[:, :max(low_bin, 1) - 1] = 0
+    spectrogram[:, high_bin:] = 0
+
+    peak = np.argmax(spectrogram, axis=1)
+    return np.where(spectrogram.max(axis=1) == 0, np.nan, peak * rate / wl / 1000)
+
+
+def specan(signal, rate, wl=2048, threshold=5, bandpass=(0, 22)):
+    """
+    Measure all acoustic features of one recording.
+
+    :param signal: Signal.
+    :param rate: Sampling rate.
+    :param wl: Frame length for the fundamental and dominant frequency tracks.
+    :param threshold: Amplitude threshold in percent.
+    :param bandpass: Frequency band in kHz for the dominant frequency.
+    :return: Dict of FEATURES.
+    """
+    features = spectral_properties(signal, rate)
+    features.update(track_features(fundamental(signal, rate, wl=wl, threshold=threshold),
+                                   dominant(signal, rate, wl=wl, threshold=threshold, bandpass=bandpass)))
+    return {name: float(features[name]) for name in FEATURES}
+
+
+def track_features(fun, dom):
+    """
+    Summarize the fundamental and dominant frequency tracks.
+
+    :param fun: Fundamental frequency track in kHz.
+    :param dom: Dominant frequency track in kHz.
+    :return: Dict of meanfun, minfun, maxfun, meandom, mindom, maxdom, dfrange and modindx.
+    """
+    features = {}
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # all-NaN tracks give NaN, as in R
+        features.update(meanfun=np.nanmean(fun), minfun=np.nanmin(fun), maxfun=np.nanmax(fun))
+        features.update(meandom=np.nanmean(dom), mindom=np.nanmin(dom), maxdom=np.nanmax(dom))
+        features['dfrange'] = features['maxdom'] - features['mindom']
+
+        changes = np.abs(np.diff(dom))
+        if features['mindom'] == features['maxdom']:
+            features['modindx'] = 0.0
+        else:
+            features['modindx'] = np.nanmean(changes) / features['dfrange']
+    return features
+
+
+class RingBuffer:
+    """
+    Fixed-size buffer holding the most recent samples of an audio stream.
+
+    :param capacity: Number of samples kept.
+    """
+
+    def __init__(self, capacity):
+        self.data = np.zeros(capacity)
+        self.written = 0  # samples written since the start of the stream
+
+    def write(self, samples):
+        capacity = len(self.data)
+        self.written += len(samples)
+        samples = samples[-capacity:]
+        start = (self.written - len(samples)) % capacity
+        first = min(len(samples), capacity - start)
+        self.data[start:start + first] = samples[:first]
+        self.data[:len(samples) - first] = samples[first:]
+
+    def read(self, start, length):
+        """
+        Samples [start, start + length) of the stream; they must still be in the buffer.
+        """
+        if start < self.written - len(self.data) or start + length > self.written:
+            raise IndexError('samples %d-%d are not in the buffer' % (start, start + length))
+        first = start % len(self.data)
+        if first + length <= len(self.data):
+            return self.data[first:first + length]
+        return np.concatenate((self.data[first:], self.data[:first + length - len(self.data)]))
+
+
+class StreamingFeatures:
+    """
+    Acoustic features of an audio stream, updated chunk by chunk.
+
+    Works like specan on everything received so far, with two differences: the spectrum statistics use the mean
+    magnitude spectrum of overlapping spectrum_wl frames instead of one FFT of the whole recording, and the
+    amplitude threshold is relative to the loudest sample so far.
+
+    :param rate: Sampling rate.
+    :param wl: Frame length for the fundamental and dominant frequency tracks.
+    :param spectrum_wl: Frame length for the spectrum statistics.
+    :param threshold: Amplitude threshold in percent.
+    :param bandpass: Frequency band in kHz for the dominant frequency.
+    """
+
+    def __init__(self, rate, wl=2048, spectrum_wl=8192, threshold=5, bandpass=(0, 22)):
+        self.rate = rate
+        self.threshold = threshold
+        self.bandpass = bandpass
+        self.buffer = RingBuffer(2 * max(wl, spectrum_wl))
+        self.peak = 0.0
+        self.spectrum_sum = np.zeros(spectrum_wl // 2)
+        self.spectrum_frames = 0
+        self.fun = []
+        self.dom = []
+        # frame length, hop and start of the next frame for every track
+        self._tracks = {'spectrum': [spectrum_wl, spectrum_wl // 2, 0], 'fun': [wl, wl // 2, 0], 'dom': [wl, wl, 0]}
+        self._window = np.hanning(spectrum_wl)
+
+    @property
+    def seconds(self):
+        return self.buffer.written / self.rate
+
+    def update(self, samples):
+        """
+        Add a chunk of samples and analyse every frame it completes.
+
+        :param samples: Samples (any numeric dtype).
+        :return: None
+        """
+        samples = np.asarray(samples, dtype=np.float64)
+        piece = len(self.buffer.data) // 2  # no frame may fall out of the buffer before it is analysed
+        for start in range(0, len(samples), piece):
+            self._update(samples[start:start + piece])
+
+    def _update(self, samples):
+        self.peak = max(self.peak, np.abs(samples).max())
+        self.buffer.write(samples)
+
+        frames = {name: self._ready_frames(name) for name in self._tracks}
+        if len(frames['spectrum']):
+            spectrum = np.abs(np.fft.rfft(frames['spectrum'] * self._window, axis=1))[:, :len(self.spectrum_sum)]
+            self.spectrum_sum += spectrum.sum(axis=0)
+            self.spectrum_frames += len(spectrum)
+        level = self.peak * self.threshold / 100
+        if len(frames['fun']):
+            self.fun.extend(cepstral_fundamental(np.where(np.abs(frames['fun']) <= level, 0.0, frames['fun']),
+                                                 self.rate).tolist())
+        if len(frames['dom']):
+            self.dom.extend(dominant_frequency(np.where(np.abs(frames['dom']) <= level, 0.0, frames['dom']),
+                                               self.rate, self.bandpass).tolist())
+
+    def features(self):
+        """
+        Features of the stream so far.
+
+        :return: Dict of FEATURES, or None before the first spectrum frame is complete.
+        """
+        if not self.spectrum_frames or not self.spectrum_sum.any():
+            return None
+        features = spectrum_properties(self.spectrum_sum / self.spectrum_frames, self.rate)
+        features.update(track_features(np.array(self.fun), np.array(self.dom)))
+        return {name: float(features[name]) for name in FEATURES}
+
+    def _ready_frames(self, name):
+        length, hop, start = self._tracks[name]
+        count = max(0, (self.buffer.written - length - start) // hop + 1)
+        if not count:
+            return np.empty((0, length))
+        frames = np.stack([self.buffer.read(start + i * hop, length) for i in range(count)])
+        self._tracks[name][2] = start + count * hop
+        return frames
+
+
+def extract_features(filenames, start=0, end=20):
+    """
+    Measure the acoustic features of WAVE files, in place of getAttributes.r.
+
+    :param filenames: Names of files.
+    :param start: Start of the analysed selection in seconds.
+    :param end: End of the analysed selection in seconds.
+    :return: pandas dataframe with sound.files, duration and FEATURES columns, one row per file.
+    """
+    rows = []
+    for filename in filenames:
+        signal, rate = read_wav(filename, start, end)
+        row = {'sound.files': os.path.basename(filename), 'duration': len(signal) / rate}
+        row.update(specan(signal, rate))
+        rows.append(row)
+    return pd.DataFrame(rows, columns=['sound.files', 'duration'] + list(FEATURES))
+
+
+def compare_with_r(location=None):
+    """
+    Check parity with getAttributes.r on the WAVE files in <location>/sounds.
+
+    Runs the R script (tuneR, seewave and warbleR must be installed) and this module on the same files.
+    :param location: Folder containing sounds/, def = current folder
+    :return: pandas dataframe of the R value, Python value and relative difference of every feature and file.
+    """
+    location = os.path.abspath(location or os.getcwd())
+    sounds = os.path.join(location, 'sounds')
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'getAttributes.r')
+    subprocess.run(['Rscript', script, location], check=True)
+
+    expected = pd.read_csv(os.path.join(location, 'output', 'voiceDetails.csv'))
+    actual = extract_features([os.path.join(sounds, name) for name in expected['sound.files']])
+    rows = []
+    for (_, r_row), (_, py_row) in zip(expected.iterrows(), actual.iterrows()):
+        for name in FEATURES:
+            r_value, py_value = r_row[name], py_row[name]
+            rows.append({'sound.files': r_row['sound.files'], 'feature': name, 'r': r_value, 'python': py_value,
+                         'rel_diff': abs(py_value - r_value) / max(abs(r_value), 1e-12)})
+    return pd.DataFrame(rows)
+
+
+if __name__ == '__main__':
+    # python acoustics.py file.wav ...   -> features of the files
+    # python acoustics.py --compare-r    -> parity with getAttributes.r on ./sounds
+    if sys.argv[1:] == ['--compare-r']:
+        report = compare_with_r()
+        print(report.to_string(index=False))
+        print('\nLargest relative difference per feature:')
+        print(report.groupby('feature', sort=False)['rel_diff'].max().to_string())
+    else:
+        print(extract_features(sys.argv[1:]).to_string(index=False))
@@ -0,0 +1,188 @@
+"""Classify every WAVE file in a directory with the trained neural net.
+
+Usage:
+    python batch_classify.py recordings/ --output results.csv
+    python batch_classify.py recordings/ --output results.parquet --workers 8
+
+Features are measured in a process pool and classified in batches. Results are appended after every batch, so an
+interrupted run continues where it stopped when started again with the same output. Files are recorded by their path
+relative to the directory, so a rerun from another working directory resumes too. A .parquet output is a directory of
+part files (needs pyarrow or fastparquet).
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import acoustics
+import neural_net
+
+COLUMNS = ['file', 'label', 'confidence', 'error'] + list(acoustics.FEATURES)
+LABELS = ('female', 'male')
+
+
+def find_wav_files(directory):
+    """
+    Find WAVE files below a directory.
+    :param directory: Directory to walk.
+    :return: Sorted list of paths.
+    """
+    paths = []
+    for root, _, files in os.walk(directory):
+        paths.extend(os.path.join(root, name) for name in files if name.lower().endswith('.wav'))
+    return sorted(paths)
+
+
+def measure(path, start=0, end=20):
+    """
+    Measure the features of one file (runs in a pool worker).
+    :param path: WAVE file.
+    :param start: Start of the analysed selection in seconds.
+    :param end: End of the analysed selection in seconds.
+    :return: Dict with file, error and feature values.
+    """
+    row = {'file': path, 'error': ''}
+    try:
+        signal, rate = acoustics.read_wav(path, start, end)  # memory-mapped where possible, only the selection is read
+        row.update(acoustics.specan(signal, rate))
+    except Exception as error:  # a broken file must not stop the batch
+        row['error'] = '%s: %s' % (type(error).__name__, error)
+    return row
+
+
+def classify(model, rows):
+    """
+    Classify a batch of measured files in one call.
+    :param model: VoiceModel.
+    :param rows: Dicts returned by measure.
+    :return: pandas dataframe with COLUMNS.
+    """
+    batch = pd.DataFrame(rows).reindex(columns=COLUMNS)
+    batch['error'] = batch['error'].fillna('')
+    batch['label'] = ''
+    batch['confidence'] = np.nan
+    valid = (batch['error'] == '') & batch[list(acoustics.FEATURES)].notna().all(axis=1)
+    batch.loc[(batch['error'] == '') & ~valid, 'error'] = 'no voice found'
+    if valid.any():
+        probabilities = model.predict_proba(batch.loc[valid, list(acoustics.FEATURES)])
+        predicted = np.argmax(probabilities, axis=1)
+        batch.loc[valid, 'label'] = np.array(LABELS)[predicted]
+        batch.loc[valid, 'confidence'] = probabilities[np.arange(len(predicted)), predicted]
+    return batch
+
+
+class CsvOutput:
+    """Results appended to a CSV file."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def done(self):
+        if not os.path.isfile(self.path) or not os.path.getsize(self.path):
+            return set()
+        self._drop_partial_line()
+        if not os.path.getsize(self.path):  # killed while writing the header: start over
+            return set()
+        return set(pd.read_csv(self.path, usecols=['file'])['file'])
+
+    def append(self, batch):
+        header = not os.path.isfile(self.path) or not os.path.getsize(self.path)
+        with open(self.path, 'a', newline='') as f:
+            batch.to_csv(f, header=header, index=False)
+            f.flush()
+
+    def _drop_partial_line(self):
+        # A run killed while writing can leave half a row at the end
+        with open(self.path, 'rb+') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(0, size - 65536))
+            tail = f.read()
+            if not tail.endswith(b'\n'):
+                f.truncate(size - len(tail) + tail.rfind(b'\n') + 1)
+
+
+class ParquetOutput:
+    """Results written as one Parquet part file per batch in a directory."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def parts(self):
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(name for name in os.listdir(self.path) if name.endswith('.parquet'))
+
+    def done(self):
+        files = set()
+        for name in self.parts():
+            files.update(pd.read_parquet(os.path.join(self.path, name), columns=['file'])['file'])
+        return files
+
+    def append(self, batch):
+        os.makedirs(self.path, exist_ok=True)
+        name = os.path.join(self.path, 'part-%05d.parquet' % len(self.parts()))
+        batch.to_parquet(name + '.tmp', index=False)
+        os.replace(name + '.tmp', name)  # only complete parts are read back
+
+
+def run(directory, output='results.csv', workers=None, batch_size=256, start=0, end=20,
+        model_file=neural_net.MODEL_FILE):
+    """
+    Classify every WAVE file below a directory that is not in the output yet.
+    :param directory: Directory to walk.
+    :param output: Results file (.csv) or directory (.parquet).
+    :param workers: Number of worker processes. def = number of cores
+    :param batch_size: Files classified and written at a time.
+    :param start: Start of the analysed selection in seconds.
+    :param end: End of the analysed selection in seconds.
+    :param model_file: Trained model.
+    :return: Number of files classified in this run.
+    """
+    model = neural_net.load_model(model_file)
+    results = ParquetOutput(output) if output.endswith('.parquet') else CsvOutput(output)
+
+    paths = find_wav_files(directory)
+    done = {os.path.normpath(name) for name in results.done()}
+    todo = [path for path in paths if os.path.relpath(path, directory) not in done]
+    print('%d WAVE files, %d already classified, %d to go' % (len(paths), len(paths) - len(todo), len(todo)))
+
+    begin = time.perf_counter()
+    processed = 0
+    with ProcessPoolExecutor(workers) as pool:
+        rows = []
+        measured = pool.map(measure, todo, [start] * len(todo), [end] * len(todo),
+                            chunksize=max(1, min(16, len(todo) // (4 * (workers or os.cpu_count())))))
+        for row in measured:
+            row['file'] = os.path.relpath(row['file'], directory)
+            rows.append(row)
+            if len(rows) == batch_size:
+                results.append(classify(model, rows))
+                processed += len(rows)
+                rows = []
+                seconds = time.perf_counter() - begin
+                print('%d/%d files, %.1f files/sec' % (processed, len(todo), processed / seconds))
+        if rows:
+            results.append(classify(model, rows))
+            processed += len(rows)
+
+    seconds = time.perf_counter() - begin
+    rate = processed / seconds if seconds else 0.0
+    print('Classified %d files in %.1f s (%.1f files/sec)' % (processed, seconds, rate))
+    return processed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Classify every WAVE file in a directory by the speaker\'s gender.')
+    parser.add_argument('directory', help='directory to search for .wav files')
+    parser.add_argument('--output', default='results.csv', help='results .csv file or .parquet directory')
+    parser.add_argument('--workers', type=int, help='worker processes (def = number of cores)')
+    parser.add_argument('--batch-size', type=int, default=256, help='files classified and written at a time')
+    parser.add_argument('--start', type=float, default=0, help='start of the analysed selection in seconds')
+    parser.add_argument('--end', type=float, default=20, help='end of the analysed selection in seconds')
+    parser.add_argument('--model', default=neural_net.MODEL_FILE, help='trained model file')
+    args = parser.parse_args()
+    run(args.directory, args.output, args.workers, args.batch_size, args.start, args.end, args.model)
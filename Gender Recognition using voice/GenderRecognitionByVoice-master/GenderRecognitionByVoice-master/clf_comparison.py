@@ -1,19 +1,78 @@
 """Compare different classifiers."""
+import os
+import time
 import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
 
+from sklearn.base import clone
 from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import StratifiedKFold
 from sklearn.neighbors import KNeighborsClassifier
 from sklearn.neural_network import MLPClassifier
 from sklearn.svm import SVC
 from sklearn.tree import DecisionTreeClassifier
+from threadpoolctl import threadpool_limits
 
 from data_process import *
 
 warnings.filterwarnings("ignore")
 
-clf_names = ('Nearest Neighbors', 'SVM', 'Decision Tree', 'Random Forest', 'Neural Net')  # classifier names
-clfs = (KNeighborsClassifier(n_neighbors=100, weights='distance'), SVC(), DecisionTreeClassifier(),
-        RandomForestClassifier(), MLPClassifier())  # classifier objects
+# (classifier name, classifier object, hyperparameter settings to try)
+# Slowest first, so the longest fits start right away and the short ones fill in the gaps.
+candidates = (
+    ('Neural Net', MLPClassifier(), [{}, {'hidden_layer_sizes': (40, 40)}, {'alpha': 1e-2}]),
+    ('Random Forest', RandomForestClassifier(), [{'n_estimators': 100}, {'n_estimators': 300}]),
+    ('SVM', SVC(), [{'C': 0.1}, {'C': 1.0}, {'C': 10.0}]),
+    ('Nearest Neighbors', KNeighborsClassifier(weights='distance'),
+     [{'n_neighbors': 5}, {'n_neighbors': 25}, {'n_neighbors': 100}]),
+    ('Decision Tree', DecisionTreeClassifier(), [{'max_depth': None}, {'max_depth': 5}, {'max_depth': 10}]),
+)
+
+_shared = {}  # array name -> numpy view of shared memory, set in every pool worker
+
+
+class SharedArrays:
+    """
+    Numpy arrays copied once into shared memory, so pool workers can use them without pickling per job.
+
+    :param arrays: Arrays to share, by name.
+    """
+
+    def __init__(self, **arrays):
+        self.blocks = []
+        self.specs = {}  # name -> (shared memory name, shape, dtype)
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+            self.blocks.append(block)
+            self.specs[name] = (block.name, array.shape, array.dtype.str)
+
+    def close(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _attach(specs):
+    """
+    Pool worker initializer: map the shared arrays and keep each worker to one thread.
+    :param specs: SharedArrays.specs
+    :return: None
+    """
+    warnings.filterwarnings("ignore")
+    threadpool_limits(1)  # the pool already uses every core
+    for name, (block_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        _shared[name + '_block'] = block
+        _shared[name] = np.ndarray(shape, dtype, buffer=block.buf)
 
 
 def train_clf(x_train, y_train, clf):
@@ -22,26 +81,72 @@ def train_clf(x_train, y_train, clf):
     :param x_train: Training inputs.
     :param y_train: Training outputs.
     :param clf: Untrained classifier object.
-    :return: Trained classifier object.
+    :return: Trained classifier object, seconds spent fitting.
+    """
+    return timed_fit(clf, x_train, y_train)  # train classifier
+
+
+def evaluate(clf_name, clf, params, fold):
+    """
+    Train and test one classifier setting on one cross-validation fold (runs in a pool worker).
+    :param clf_name: Classifier name.
+    :param clf: Untrained classifier object.
+    :param params: Hyperparameters to set on clf.
+    :param fold: Fold used for testing.
+    :return: Dict of results.
     """
-    clf.fit(x_train, y_train)  # train classifier
+    x, y, test = _shared['x'], _shared['y'], _shared['folds'] == fold
+    scaler = Scaler().fit(x[~test])  # statistics of the training folds only
+    x_train, x_test = scaler.transform(x[~test]), scaler.transform(x[test])
+    clf, fit_seconds = train_clf(x_train, y[~test], clone(clf).set_params(**params))
+    metrics = get_accuracy(x_train, x_test, y[~test], y[test], clf, fit_seconds)
+    return dict(classifier=clf_name, params=str(params), fold=fold, **metrics.as_dict())
+
 
-    return clf
+def leaderboard(results):
+    """
+    Average the fold results of every classifier setting.
+    :param results: Dicts returned by evaluate.
+    :return: pandas DataFrame sorted by testing accuracy.
+    """
+    table = pd.DataFrame(results).groupby(['classifier', 'params']).agg(
+        accuracy=('accuracy', 'mean'), accuracy_std=('accuracy', 'std'), train_accuracy=('train_accuracy', 'mean'),
+        fit_seconds=('fit_seconds', 'mean'), latency_us=('latency', 'mean'))
+    table['latency_us'] *= 1e6
+    return table.sort_values(['accuracy', 'fit_seconds'], ascending=[False, True]).reset_index()
 
 
-def run():
+def run(n_splits=5, max_workers=None):
     """
     main.
-    :return: None
+    :param n_splits: Number of cross-validation folds.
+    :param max_workers: Number of worker processes. def = number of cores
+    :return: Leaderboard (pandas DataFrame)
     """
     voice_data = read()  # read data
-    x_train, x_test, y_train, y_test = preprocess(voice_data)  # preprocess data
+    print('\nPreprocessing data...')
+    x, y = features_and_labels(voice_data)
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y)
+    folds = np.empty(len(y), dtype=np.int8)
+    for fold, (_, test) in enumerate(StratifiedKFold(n_splits, shuffle=True, random_state=1).split(x, y)):
+        folds[test] = fold
+
+    jobs = [(clf_name, clf, params, fold)
+            for clf_name, clf, grid in candidates for params in grid for fold in range(n_splits)]
+    print('\nRunning %d jobs on %d workers...' % (len(jobs), max_workers or os.cpu_count()))
+    start = time.perf_counter()
+    results = []
+    with SharedArrays(x=x, y=y, folds=folds) as arrays, \
+            ProcessPoolExecutor(max_workers, initializer=_attach, initargs=(arrays.specs,)) as pool:
+        for future in as_completed([pool.submit(evaluate, *job) for job in jobs]):
+            results.append(future.result())
+    seconds = time.perf_counter() - start
 
-    for clf_name, clf in zip(clf_names, clfs):  # for all classifiers
-        clf = train_clf(x_train, y_train, clf)  # train classifier
-        print()
-        print(clf_name)
-        get_accuracy(x_train, x_test, y_train, y_test, clf)  # print results
+    table = leaderboard(results)
+    print()
+    print(table.to_string(index=False, float_format='%.4f'))
+    print('\nSweep took %.2f s (slowest single fit %.2f s)' % (seconds, max(r['fit_seconds'] for r in results)))
+    return table
 
 
 if __name__ == '__main__':
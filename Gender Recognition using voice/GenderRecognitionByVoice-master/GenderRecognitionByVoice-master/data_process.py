@@ -1,4 +1,9 @@
 """Contains functions for data processing"""
+import hashlib
+import json
+import os
+import time
+
 import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
@@ -6,16 +11,18 @@ from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import LabelEncoder
 
 
-def read(filename='voice.csv'):
+def read(filename='voice.csv', cache=True):
     """
     Read data from file.
 
+    The CSV is parsed once into a binary cache next to it (see load_cached); later reads memory-map the cache.
     :param filename:  Name of file containing data.
+    :param cache: Whether to use the binary cache. def = True
     :return: data.
     """
     data = None
     try:
-        data = pd.read_csv(filename)  # read data from csv file
+        data = load_cached(filename) if cache else pd.read_csv(filename)  # read data from csv file
         print('\nReading data...')
     except FileNotFoundError:
         print('\nFile not found!')  # print error if file is absent
@@ -23,33 +30,206 @@ def read(filename='voice.csv'):
     return data
 
 
-def scale(data):
+CACHE_VERSION = 1  # bump when the cache layout changes
+
+
+def _file_hash(filename):
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_cached(filename='voice.csv'):
     """
-    Scale the data between -1 and 1.
+    Load a CSV with the label in the last column through a binary cache.
 
-    :param data: The data to be scaled.
-    :return: Scaled data.
+    The cache is a directory <filename>.cache holding the inputs as a float32 .npy matrix, the labels as a uint8
+    .npy array of codes and a meta.json with the column names, label names and the source file's size, mtime and
+    SHA-256. The cache is rebuilt only when the source's content changes; a changed mtime with the same hash just
+    refreshes meta.json. If the cache can't be written (e.g. a read-only directory) the CSV is read directly.
+    :param filename: Name of CSV file.
+    :return: data (inputs are memory-mapped float32 columns).
     """
-    return (data - data.mean()) / (data.max() - data.min())
+    stat = os.stat(filename)  # raises FileNotFoundError like pd.read_csv
+    folder = filename + '.cache'
+    meta_file = os.path.join(folder, 'meta.json')
+    meta = None
+    if os.path.isfile(meta_file):
+        with open(meta_file) as f:
+            meta = json.load(f)
+        if meta.get('version') != CACHE_VERSION:
+            meta = None
+        elif (meta['size'], meta['mtime']) != (stat.st_size, stat.st_mtime):
+            digest = _file_hash(filename)
+            if meta['sha256'] != digest:
+                meta = None
+            else:  # touched but unchanged
+                meta.update(size=stat.st_size, mtime=stat.st_mtime)
+                try:
+                    _write_json(meta_file, meta)
+                except OSError:
+                    pass  # still valid, the hash is checked again next time
+
+    if meta is None:
+        try:
+            meta = _build_cache(filename, folder, stat)
+        except OSError:
+            return pd.read_csv(filename)
+
+    x = np.load(os.path.join(folder, 'inputs.npy'), mmap_mode='r')
+    codes = np.load(os.path.join(folder, 'labels.npy'), mmap_mode='r')
+    data = pd.DataFrame(x, columns=meta['columns'], copy=False)
+    data[meta['label']] = np.asarray(meta['classes'], dtype=object)[codes]
+    return data
+
+
+def _build_cache(filename, folder, stat):
+    data = pd.read_csv(filename)
+    classes, codes = np.unique(data.iloc[:, -1].astype(str), return_inverse=True)
+    os.makedirs(folder, exist_ok=True)
+    for name, array in (('inputs.npy', data.iloc[:, :-1].to_numpy(dtype=np.float32)),
+                        ('labels.npy', codes.astype(np.uint8))):
+        with open(os.path.join(folder, name + '.tmp'), 'wb') as f:
+            np.save(f, array)
+        os.replace(os.path.join(folder, name + '.tmp'), os.path.join(folder, name))
+    meta = {'version': CACHE_VERSION, 'columns': list(data.columns[:-1]), 'label': data.columns[-1],
+            'classes': classes.tolist(), 'size': stat.st_size, 'mtime': stat.st_mtime,
+            'sha256': _file_hash(filename)}
+    _write_json(os.path.join(folder, 'meta.json'), meta)  # written last, so a half-built cache is never used
+    return meta
+
+
+def _write_json(filename, obj):
+    with open(filename + '.tmp', 'w') as f:
+        json.dump(obj, f)
+    os.replace(filename + '.tmp', filename)
+
+
+class Scaler:
+    """
+    Scale inputs to (x - mean) / (max - min), with the statistics of the data it was fitted on.
+
+    Fit it on training data only and save it with the model, so evaluation and inference scale inputs the same
+    way. partial_fit updates the statistics one chunk at a time, for data that doesn't fit in memory.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = self.min = self.max = None
+        self.columns = None
+
+    def partial_fit(self, x):
+        """
+        Update the statistics with a chunk of inputs (one pass over the chunk).
+        :param x: Inputs (pandas dataframe or 2D array).
+        :return: self
+        """
+        if isinstance(x, pd.DataFrame):
+            if self.columns is None:
+                self.columns = list(x.columns)
+            x = x[self.columns]
+        x = np.asarray(x, dtype=np.float64)
+        if not len(x):
+            return self
+        chunk_mean, chunk_min, chunk_max = x.mean(axis=0), x.min(axis=0), x.max(axis=0)
+        if not self.count:
+            self.mean, self.min, self.max = chunk_mean, chunk_min, chunk_max
+        else:
+            self.mean = self.mean + (chunk_mean - self.mean) * len(x) / (self.count + len(x))
+            self.min, self.max = np.minimum(self.min, chunk_min), np.maximum(self.max, chunk_max)
+        self.count += len(x)
+        return self
+
+    def fit(self, x):
+        """
+        Compute the statistics of the inputs.
+        :param x: Inputs (pandas dataframe or 2D array).
+        :return: self
+        """
+        self.__init__()
+        return self.partial_fit(x)
+
+    @property
+    def spread(self):
+        spread = self.max - self.min
+        return np.where(spread == 0, 1.0, spread)  # constant columns are left centred, not divided by zero
+
+    def transform(self, x):
+        """
+        Scale inputs.
+        :param x: Inputs (pandas dataframe or 2D array).
+        :return: Scaled inputs, of the same type.
+        """
+        if not self.count:
+            raise ValueError('Scaler is not fitted')
+        if isinstance(x, pd.DataFrame):
+            if self.columns is not None:
+                x = x[self.columns]
+            return (x - self.mean) / self.spread
+        return (np.asarray(x, dtype=np.float64) - self.mean) / self.spread
+
+    def fit_transform(self, x):
+        return self.fit(x).transform(x)
+
+    def to_dict(self):
+        return {'count': self.count, 'mean': self.mean.tolist(), 'min': self.min.tolist(),
+                'max': self.max.tolist(), 'columns': self.columns}
+
+    @classmethod
+    def from_dict(cls, state):
+        scaler = cls()
+        scaler.count, scaler.columns = state['count'], state['columns']
+        scaler.mean, scaler.min, scaler.max = (np.asarray(state[key]) for key in ('mean', 'min', 'max'))
+        return scaler
+
+
+def fit_scaler(filename='voice.csv', chunksize=100000):
+    """
+    Fit a Scaler on a CSV file read in chunks, without loading all of it.
+    :param filename: Name of CSV file with the label in the last column.
+    :param chunksize: Rows per chunk.
+    :return: Scaler
+    """
+    scaler = Scaler()
+    for chunk in pd.read_csv(filename, chunksize=chunksize):
+        scaler.partial_fit(chunk.iloc[:, :-1])
+    return scaler
+
+
+def features_and_labels(data):
+    """
+    Split data into inputs and encoded outputs.
+
+    :param data: Data with the label in the last column.
+    :return: x, y
+    """
+    x = data.iloc[:, :-1]  # get inputs from data
+
+    y = data.iloc[:, -1]  # get outputs
+    y = LabelEncoder().fit_transform(y)  # encode label (female -> 0, male -> 1)
+
+    return x, y
 
 
 def preprocess(data):
     """
     Preprocess data.
 
+    The inputs are scaled with statistics of the training data only.
     :param data: Data to be preprocessed.
-    :return: x_train, y_train, x_test, y_test
+    :return: x_train, x_test, y_train, y_test, scaler
     """
     print('\nPreprocessing data...')
 
-    x = data.iloc[:, :-1]  # get inputs from data
-    x = scale(x)  # scale inputs
+    x, y = features_and_labels(data)
 
-    y = data.iloc[:, -1]  # get outputs
-    y = LabelEncoder().fit_transform(y)  # encode label (female -> 0, male -> 1)
+    # split into training and testing data with randomized order
+    x_train, x_test, y_train, y_test = train_test_split(x, y, train_size=.75, random_state=1)
 
-    # split into training and testing data with randomized order and return
-    return train_test_split(x, y, train_size=.75, random_state=1)
+    scaler = Scaler().fit(x_train)  # scale inputs
+    return scaler.transform(x_train), scaler.transform(x_test), y_train, y_test, scaler
 
 
 def visualize(data, style='ggplot', graph_type='line'):
@@ -76,48 +256,119 @@ def visualize(data, style='ggplot', graph_type='line'):
     plt.show()
 
 
-def get_accuracy(x_train, x_test, y_train, y_test, clf):
+class Metrics:
+    """
+    Evaluation results of a classifier.
+
+    Holds the training and testing accuracy, the testing confusion matrix counts (label 1 is positive), and the
+    time spent fitting and predicting. Printing it gives the usual results report.
     """
-    Calculate and print training and testing accuracy.
+
+    def __init__(self, train_accuracy, tp, tn, fp, fn, fit_seconds=None, predict_seconds=0.0, n_predicted=0):
+        self.train_accuracy = train_accuracy
+        self.tp, self.tn, self.fp, self.fn = tp, tn, fp, fn
+        self.fit_seconds = fit_seconds
+        self.predict_seconds = predict_seconds
+        self.n_predicted = n_predicted
+
+    @property
+    def accuracy(self):
+        return _ratio(self.tp + self.tn, self.tp + self.tn + self.fp + self.fn)
+
+    @property
+    def precision(self):
+        return _ratio(self.tp, self.tp + self.fp)
+
+    @property
+    def recall(self):
+        return _ratio(self.tp, self.tp + self.fn)
+
+    @property
+    def specificity(self):
+        return _ratio(self.tn, self.tn + self.fp)
+
+    @property
+    def confusion_matrix(self):
+        """2x2 array, rows are actual and columns predicted labels (0, 1)."""
+        return np.array([[self.tn, self.fp], [self.fn, self.tp]])
+
+    @property
+    def latency(self):
+        """Mean prediction time per sample in seconds."""
+        return _ratio(self.predict_seconds, self.n_predicted)
+
+    def as_dict(self):
+        return {'train_accuracy': self.train_accuracy, 'accuracy': self.accuracy, 'precision': self.precision,
+                'recall': self.recall, 'specificity': self.specificity, 'tp': self.tp, 'tn': self.tn,
+                'fp': self.fp, 'fn': self.fn, 'fit_seconds': self.fit_seconds,
+                'predict_seconds': self.predict_seconds, 'latency': self.latency}
+
+    def __str__(self):
+        lines = ['Training Results:',
+                 'Accuracy = %.1f%%' % (self.train_accuracy * 100),
+                 '',
+                 'Testing Results:',
+                 'Accuracy  = %.1f%%' % (self.accuracy * 100),
+                 'Precision   = %.1f%%' % (self.precision * 100),
+                 'Recall      = %.1f%%' % (self.recall * 100),
+                 'Specificity = %.1f%%' % (self.specificity * 100),
+                 '']
+        if self.fit_seconds is not None:
+            lines.append('Fit time     = %.3f s' % self.fit_seconds)
+        lines.append('Predict time = %.3f s (%.1f us/sample)' % (self.predict_seconds, self.latency * 1e6))
+        return '\n'.join(lines)
+
+
+def _ratio(numerator, denominator):
+    return numerator / denominator if denominator else 0.0
+
+
+def confusion_counts(actual, predicted):
+    """
+    Count the binary confusion matrix in one pass.
+
+    :param actual: Actual labels (0 or 1).
+    :param predicted: Predicted labels (0 or 1).
+    :return: tp, tn, fp, fn
+    """
+    counts = np.bincount(np.asarray(actual, dtype=np.intp) * 2 + np.asarray(predicted, dtype=np.intp),
+                         minlength=4)
+    tn, fp, fn, tp = (int(count) for count in counts[:4])
+    return tp, tn, fp, fn
+
+
+def timed_fit(clf, x_train, y_train):
+    """
+    Train a classifier and time it.
+
+    :param clf: Untrained classifier object.
+    :param x_train: Training inputs.
+    :param y_train: Training outputs.
+    :return: Trained classifier object, seconds spent fitting.
+    """
+    start = time.perf_counter()
+    clf.fit(x_train, y_train)
+    return clf, time.perf_counter() - start
+
+
+def get_accuracy(x_train, x_test, y_train, y_test, clf, fit_seconds=None):
+    """
+    Calculate training and testing accuracy.
+
+    Each split is predicted with a single clf.predict call.
     :param x_train: Training inputs.
     :param y_train: Training Outputs.
     :param x_test: Testing inputs.
     :param y_test: Testing outputs.
     :param clf: Trained classifier object.
-    :return: None
+    :param fit_seconds: Time spent training clf, if known (see timed_fit).
+    :return: Metrics
     """
-    print('\nTraining Results:')
-    correct = 0
-    for index in range(len(y_train)):
-        temp=x_train.iloc[index,:]
-        temp=np.array(temp).reshape((1,-1))
-        predicted = clf.predict(temp)
-        actual = y_train[index]
-        if actual == predicted:
-            correct += 1
-    print('Accuracy = %.1f%%' % (correct / len(y_train) * 100))
-
-    tp = tn = fp = fn = 0
-    for index in range(len(y_test)):
-        temp1=x_test.iloc[index,:]
-        temp1=np.array(temp1).reshape((1,-1))
-        predicted = clf.predict(temp1)
-        actual = y_test[index]
-        if actual == predicted == 0:
-            tn += 1
-        elif actual == predicted == 1:
-            tp += 1
-        elif actual == 0 != predicted:
-            fp += 1
-        else:
-            fn += 1
-    # print(tp, fp, tn, fn)
-    accuracy = (tp + tn) / (tp + tn + fp + fn)
-    precision = tp / (tp + fp)
-    recall = tp / (tp + fn)
-    specificity = tn / (tn + fp)
-    print('\nTesting Results:')
-    print('Accuracy  = %.1f%%' % (accuracy * 100))
-    print('Precision   = %.1f%%' % (precision * 100))
-    print('Recall      = %.1f%%' % (recall * 100))
-    print('Specificity = %.1f%%' % (specificity * 100))
+    start = time.perf_counter()
+    train_predicted = clf.predict(x_train)
+    test_predicted = clf.predict(x_test)
+    predict_seconds = time.perf_counter() - start
+
+    train_accuracy = float(np.mean(np.asarray(train_predicted) == np.asarray(y_train))) if len(y_train) else 0.0
+    tp, tn, fp, fn = confusion_counts(y_test, test_predicted)
+    return Metrics(train_accuracy, tp, tn, fp, fn, fit_seconds, predict_seconds, len(y_train) + len(y_test))
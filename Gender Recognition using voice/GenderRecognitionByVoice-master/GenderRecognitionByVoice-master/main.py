@@ -1,9 +1,6 @@
 import os
-import pickle
-from subprocess import run
-
-import pandas as pd
 
+import acoustics
 import neural_net
 import sound_recorder
 
@@ -12,34 +9,38 @@ if __name__ == '__main__':
         print('\nMenu')
         print('1. Train Neural Net')
         print('2. Analyse Voice')
-        print('3. Exit')
+        print('3. Analyse Voice Live')
+        print('4. Exit')
         option = input('Enter Option Number: ')
 
         if option == '1':
             neural_net.run()
-        elif option == '2':
-            if not os.path.isfile('trained_neural_net'):  # check if neural_net file exists
+        elif option in ('2', '3'):
+            if not os.path.isfile(neural_net.MODEL_FILE):  # check if neural_net file exists
                 print('\nNeural net not trained. First train the neural net.')
-            else:
+                continue
+            try:
+                model = neural_net.load_model()  # stays in memory until the neural net is trained again
+            except ValueError as error:
+                print('\n' + str(error))
+                continue
+
+            if option == '2':
                 sound_recorder.run()
 
                 print('\nExtracting data from recorded voice...\n')
-                run(['Rscript', 'getAttributes.r',
-                     os.getcwd()])  # running R script for extracting data from recorded voice
-
-                print('\n\nPreprocessing extracted data...')
-                data = pd.read_csv('output/voiceDetails.csv')
-                del data['peakf'], data['sound.files'], data['selec'], data['duration']
-                dataset = pd.read_csv('voice.csv')
-                dataset = dataset.iloc[:, :-1]
-                data = (data - dataset.mean()) / (dataset.max() - dataset.min())  # scale
-
-                trained_neural_net = pickle.load(open('trained_neural_net', 'rb'))  # load trained neural net from file
-
-                print('\nPrediction: \r')
-                print('Female' if trained_neural_net.predict(data)[0] == 0 else 'Male')  # print prediction
-                break
-        elif option == '3':
+                data = acoustics.extract_features(['sounds/' + sound_recorder.WAVE_OUTPUT_FILENAME])
+                label = model.predict(data)[0]  # scale and predict
+            else:
+                prediction = sound_recorder.run_streaming(model)  # rolling predictions while recording
+                if prediction is None:
+                    print('\nNot enough audio for a prediction.')
+                    continue
+                label = prediction.label
+
+            print('\nPrediction: \r')
+            print('Female' if label == 0 else 'Male')  # print prediction
+        elif option == '4':
             print('\nExiting...')
             break
         else:
@@ -1,4 +1,5 @@
 """Train and validate neural net"""
+import os
 import pickle
 import warnings
 
@@ -9,23 +10,111 @@ from data_process import *
 warnings.filterwarnings("ignore")
 
 
-def train_neural_net(x_train, y_train):
+MODEL_FILE = 'trained_neural_net'
+ARTIFACT_VERSION = 2  # bump when the saved format changes
+
+
+class VoiceModel:
+    """
+    Trained neural net together with what is needed to prepare its inputs.
+
+    :param model: Trained classifier object.
+    :param columns: Feature names, in the order the model expects them.
+    :param scaler: Scaler fitted on the training data.
+    """
+
+    def __init__(self, model, columns, scaler):
+        self.model = model
+        self.columns = list(columns)
+        self.scaler = scaler
+
+    def transform(self, data):
+        """
+        Select and scale features the way the training data was scaled.
+        :param data: Extracted features (pandas dataframe), extra columns are ignored.
+        :return: Scaled inputs.
+        """
+        return self.scaler.transform(data[self.columns])
+
+    def predict(self, data):
+        """
+        Predict labels (female -> 0, male -> 1).
+        :param data: Extracted features (pandas dataframe).
+        :return: Predicted labels.
+        """
+        return self.model.predict(self.transform(data))
+
+    def predict_proba(self, data):
+        """
+        Predict label probabilities.
+        :param data: Extracted features (pandas dataframe).
+        :return: (n_samples, 2) array of female and male probabilities.
+        """
+        return self.model.predict_proba(self.transform(data))
+
+    def save(self, filename=MODEL_FILE):
+        """
+        Save the model, its feature order and scaling statistics to a single file.
+        :param filename: Name of file.
+        :return: None
+        """
+        artifact = {'version': ARTIFACT_VERSION, 'model': self.model, 'columns': self.columns,
+                    'scaler': self.scaler.to_dict()}
+        with open(filename + '.tmp', 'wb') as f:
+            pickle.dump(artifact, f)
+        os.replace(filename + '.tmp', filename)  # never leave a half-written model behind
+
+    @classmethod
+    def load(cls, filename=MODEL_FILE):
+        """
+        Load a model saved with save.
+        :param filename: Name of file.
+        :return: VoiceModel
+        """
+        with open(filename, 'rb') as f:
+            artifact = pickle.load(f)
+        if not isinstance(artifact, dict) or artifact.get('version') != ARTIFACT_VERSION:
+            raise ValueError('%s was saved by another version. Train the neural net again.' % filename)
+        return cls(artifact['model'], artifact['columns'], Scaler.from_dict(artifact['scaler']))
+
+
+_loaded = {}  # filename -> (modification time, VoiceModel)
+
+
+def load_model(filename=MODEL_FILE):
+    """
+    Load the trained model, reusing the one already in memory unless the file changed.
+    :param filename: Name of file.
+    :return: VoiceModel
+    """
+    mtime = os.path.getmtime(filename)
+    if filename not in _loaded or _loaded[filename][0] != mtime:
+        _loaded[filename] = (mtime, VoiceModel.load(filename))
+    return _loaded[filename][1]
+
+
+def train_neural_net(x_train, y_train, scaler):
     """
     Train and save neural net.
-    :param x_train: Training inputs.
+    :param x_train: Training inputs (scaled).
     :param y_train: Training outputs.
+    :param scaler: Scaler the inputs were scaled with (returned by preprocess), saved with the neural net.
     :return: Trained neural_net
     """
+    if scaler is None:
+        raise ValueError('train_neural_net needs the scaler returned by preprocess, the saved model is useless '
+                         'without it')
     print('\nTraining neural net...')
     neural_net = MLPClassifier()
     # (hidden_layer_sizes=(40, 40), activation='identity', solver='sgd',
     #                        learning_rate='adaptive', max_iter=2000, verbose=True)
-    neural_net.fit(x_train, y_train)  # train neural net
+    neural_net, fit_seconds = timed_fit(neural_net, x_train, y_train)  # train neural net
+    print('Trained in %.2f s' % fit_seconds)
 
     # print(neural_net.coefs_)
 
     print('\nSaving trained neural net to file...')
-    pickle.dump(neural_net, open('trained_neural_net', 'wb'))
+    VoiceModel(neural_net, x_train.columns, scaler).save()
 
     visualize(pd.Series(neural_net.loss_curve_), graph_type='area')  # plot loss curve
 
@@ -39,12 +128,12 @@ def run():
     """
     voice_data = read()  # read data
 
-    x_train, x_test, y_train, y_test = preprocess(voice_data)  # preprocess data
+    x_train, x_test, y_train, y_test, scaler = preprocess(voice_data)  # preprocess data
 
-    trained_neural_net = train_neural_net(x_train, y_train)  # train neural net
+    trained_neural_net = train_neural_net(x_train, y_train, scaler)  # train neural net
 
     print('\nCalculating accuracy...\n')
-    get_accuracy(x_train, x_test, y_train, y_test, trained_neural_net)  # print results
+    print(get_accuracy(x_train, x_test, y_train, y_test, trained_neural_net))  # print results
 
 
 if __name__ == '__main__':
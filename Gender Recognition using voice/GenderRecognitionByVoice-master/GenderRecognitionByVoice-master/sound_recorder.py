@@ -1,54 +1,172 @@
-"""Record a few seconds of audio and save to a WAVE file."""
+"""Record a few seconds of audio and save to a WAVE file, or predict the speaker's gender while recording."""
 import os
 import time
 import wave
+from collections import deque, namedtuple
 
-import pyaudio
+import numpy as np
+import pandas as pd
+
+from acoustics import StreamingFeatures
 
 CHUNK = 1024
-FORMAT = pyaudio.paInt16
+SAMPLE_WIDTH = 2  # 16 bit samples
 CHANNELS = 1
 RATE = 44100
 RECORD_SECONDS = 20
 WAVE_OUTPUT_FILENAME = 'output.wav'
 
-p = pyaudio.PyAudio()
+TEXT = ('My biggest mistake was attempting to stifle my laughter in a library. It came out as a loud snort, one that '
+        'would make the largest pig proud. The librarian quietly shuffled over. She slid her glasses down her nose. I'
+        ' could see the rage glowing in her muddy brown eyes. She mumbled a few words at me and then jabbed her bony '
+        'finger at the center of her glasses, returning them to the bridge of her nose. She turned away, clicking her'
+        ' tongue against the roof of her mouth. I could swear I saw a smirk crinkle at the corner of her mouth.')
 
-stream = p.open(format=FORMAT, channels=CHANNELS, rate=RATE, input=True, frames_per_buffer=CHUNK)
+Prediction = namedtuple('Prediction', ['seconds', 'label', 'confidence', 'stable'])
 
-if not os.path.exists('sounds'):
-    os.makedirs('sounds')
 
+class Microphone:
+    """
+    Audio source reading CHUNK-sized frames from the default input device.
 
-def run():
-    input('Speak for 20 secs after pressing \'Enter\': ')
-    print('\nREAD NOW!')
-    print('My biggest mistake was attempting to stifle my laughter in a library. It came out as a loud snort, one that '
-          'would make the largest pig proud. The librarian quietly shuffled over. She slid her glasses down her nose. I'
-          ' could see the rage glowing in her muddy brown eyes. She mumbled a few words at me and then jabbed her bony '
-          'finger at the center of her glasses, returning them to the bridge of her nose. She turned away, clicking her'
-          ' tongue against the roof of her mouth. I could swear I saw a smirk crinkle at the corner of her mouth.')
-    time.sleep(.5)
+    PyAudio is only imported and opened when iteration starts, and closed when it ends.
+    :param seconds: Maximum recording length.
+    """
 
-    frames = []
+    def __init__(self, seconds=RECORD_SECONDS, rate=RATE):
+        self.seconds = seconds
+        self.rate = rate
 
-    for i in range(0, int(RATE / CHUNK * RECORD_SECONDS)):
-        data = stream.read(CHUNK)
-        frames.append(data)
+    def __iter__(self):
+        import pyaudio
+
+        p = pyaudio.PyAudio()
+        stream = p.open(format=p.get_format_from_width(SAMPLE_WIDTH), channels=CHANNELS, rate=self.rate,
+                        input=True, frames_per_buffer=CHUNK)
+        try:
+            for _ in range(int(self.rate / CHUNK * self.seconds)):
+                yield np.frombuffer(stream.read(CHUNK), dtype=np.int16)
+        finally:
+            stream.stop_stream()
+            stream.close()
+            p.terminate()
 
-    print('\nRecording Saved.')
-    stream.stop_stream()
-    stream.close()
 
-    p.terminate()
+class WaveFile:
+    """
+    Audio source reading CHUNK-sized frames from a 16 bit WAVE file, in place of the microphone.
 
+    :param filename: Name of file.
+    :param realtime: Whether to deliver chunks at the speed they would be recorded.
+    """
+
+    def __init__(self, filename, realtime=False):
+        self.filename = filename
+        self.realtime = realtime
+        with wave.open(filename, 'rb') as wf:
+            self.rate = wf.getframerate()
+
+    def __iter__(self):
+        with wave.open(self.filename, 'rb') as wf:
+            channels = wf.getnchannels()
+            while True:
+                data = wf.readframes(CHUNK)
+                if not data:
+                    return
+                if self.realtime:
+                    time.sleep(len(data) / (SAMPLE_WIDTH * channels) / self.rate)
+                yield np.frombuffer(data, dtype=np.int16)[::channels]  # first channel
+
+
+def record(source):
+    """
+    Record from an audio source to sounds/WAVE_OUTPUT_FILENAME.
+    :param source: Iterable of int16 sample chunks (e.g. Microphone).
+    :return: None
+    """
+    frames = [np.asarray(chunk, dtype=np.int16).tobytes() for chunk in source]
+    print('\nRecording Saved.')
+
+    if not os.path.exists('sounds'):
+        os.makedirs('sounds')
     wf = wave.open('sounds/' + WAVE_OUTPUT_FILENAME, 'wb')
     wf.setnchannels(CHANNELS)
-    wf.setsampwidth(p.get_sample_size(FORMAT))
-    wf.setframerate(RATE)
+    wf.setsampwidth(SAMPLE_WIDTH)
+    wf.setframerate(getattr(source, 'rate', RATE))
     wf.writeframes(b''.join(frames))
     wf.close()
 
 
+def stream_predictions(model, source, rate=None, interval_ms=500, min_seconds=3, window=4, tolerance=.02,
+                       min_confidence=.8):
+    """
+    Predict the speaker's gender while audio is still arriving.
+
+    Features are updated with every chunk; a prediction is made every interval_ms of audio. The stream stops
+    early once the last `window` predictions agree on the label with confidences within `tolerance` of each other.
+    :param model: VoiceModel (see neural_net.load_model).
+    :param source: Iterable of sample chunks (Microphone, WaveFile or any generator of arrays or int16 bytes).
+    :param rate: Sampling rate. def = source.rate or RATE
+    :param interval_ms: Audio time between predictions.
+    :param min_seconds: Audio time before the stream may stop early.
+    :param window: Number of agreeing predictions needed to stop.
+    :param tolerance: Largest confidence change within the window to stop.
+    :param min_confidence: Smallest confidence to stop.
+    :return: Generator of Prediction(seconds, label, confidence, stable).
+    """
+    rate = rate or getattr(source, 'rate', RATE)
+    features = StreamingFeatures(rate)
+    interval = rate * interval_ms / 1000
+    next_prediction = interval
+    recent = deque(maxlen=window)
+    for chunk in source:
+        if isinstance(chunk, bytes):
+            chunk = np.frombuffer(chunk, dtype=np.int16)
+        features.update(chunk)
+        if features.buffer.written < next_prediction:
+            continue
+        next_prediction += interval
+        values = features.features()
+        if values is None:
+            continue
+
+        probabilities = model.predict_proba(pd.DataFrame([values]))[0]
+        label = int(np.argmax(probabilities))
+        recent.append((label, probabilities[label]))
+        confidences = [confidence for _, confidence in recent]
+        stable = bool(features.seconds >= min_seconds and len(recent) == window
+                      and len({label for label, _ in recent}) == 1 and min(confidences) >= min_confidence
+                      and max(confidences) - min(confidences) <= tolerance)
+        yield Prediction(features.seconds, label, float(probabilities[label]), stable)
+        if stable:
+            return
+
+
+def run_streaming(model, source=None):
+    """
+    Print rolling predictions from the microphone (or another source) until they are stable.
+    :param model: VoiceModel.
+    :param source: Audio source. def = Microphone()
+    :return: Last Prediction, or None if the audio was too short.
+    """
+    input('Speak after pressing \'Enter\', the prediction updates as you read: ')
+    print('\nREAD NOW!')
+    print(TEXT)
+    prediction = None
+    for prediction in stream_predictions(model, source or Microphone()):
+        print('%5.1f s  %-6s  %.0f%%%s' % (prediction.seconds, 'Female' if prediction.label == 0 else 'Male',
+                                          prediction.confidence * 100, '  (stable)' if prediction.stable else ''))
+    return prediction
+
+
+def run():
+    input('Speak for 20 secs after pressing \'Enter\': ')
+    print('\nREAD NOW!')
+    print(TEXT)
+    time.sleep(.5)
+
+    record(Microphone())
+
+
 if __name__ == '__main__':
     run()
@@ -0,0 +1,44 @@
+"""Write the sample WAVE files in sounds/ used by test_acoustics.py.
+
+Voice-like harmonic tones with a known pitch at the sampling rates and sample widths recordings come in. The name
+of each file gives its fundamental frequency in Hz.
+"""
+import os
+import wave
+
+import numpy as np
+
+SOUNDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sounds')
+
+# name, sampling rate, bytes per sample, fundamental (Hz), vibrato depth (Hz)
+SAMPLES = (
+    ('male_120hz.wav', 44100, 2, 120, 0),
+    ('female_210hz.wav', 22050, 2, 210, 0),
+    ('vibrato_160hz.wav', 16000, 3, 160, 15),
+)
+
+
+def voice(rate, f0, vibrato, seconds=1.5, harmonics=12):
+    t = np.arange(int(rate * seconds)) / rate
+    phase = 2 * np.pi * np.cumsum(f0 + vibrato * np.sin(2 * np.pi * 5 * t)) / rate
+    signal = sum(np.sin(k * phase) / k for k in range(1, harmonics + 1) if k * f0 < rate / 2)
+    signal = signal / np.abs(signal).max()
+    signal += np.random.default_rng(f0).normal(0, .01, len(t))  # breath noise, keeps the cepstrum finite
+    envelope = np.minimum(1, np.minimum(t, t[-1] - t) / .05)  # 50 ms fade in and out
+    return signal * envelope * .7
+
+
+def write(path, signal, rate, width):
+    samples = np.round(signal * (2 ** (8 * width - 1) - 1)).astype('<i4')
+    data = samples.view(np.uint8).reshape(-1, 4)[:, :width].tobytes()  # little-endian, low bytes first
+    with wave.open(path, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(width)
+        wf.setframerate(rate)
+        wf.writeframes(data)
+
+
+if __name__ == '__main__':
+    os.makedirs(SOUNDS, exist_ok=True)
+    for name, rate, width, f0, vibrato in SAMPLES:
+        write(os.path.join(SOUNDS, name), voice(rate, f0, vibrato), rate, width)
@@ -0,0 +1,59 @@
+"""Parity of acoustics.py with getAttributes.r on the sample recordings in tests/data/sounds.
+
+The R reference rows are read from tests/data/output/voiceDetails.csv, which getAttributes.r writes with
+    Rscript getAttributes.r tests/data
+so the tests run without R. The sample recordings are made by tests/data/make_sounds.py; the pitch of each is in
+its name, which is also checked directly.
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import acoustics  # noqa: E402
+
+SOUNDS = os.path.join(HERE, 'data', 'sounds')
+R_OUTPUT = os.path.join(HERE, 'data', 'output', 'voiceDetails.csv')
+SAMPLES = sorted(name for name in os.listdir(SOUNDS) if name.endswith('.wav'))
+
+# Relative tolerance per feature; tracks taken from frames (fundamental, dominant) are allowed more
+TOLERANCE = dict.fromkeys(acoustics.FEATURES, .02)
+TOLERANCE.update(dict.fromkeys(('skew', 'kurt', 'meanfun', 'minfun', 'maxfun', 'meandom', 'mindom', 'maxdom',
+                                'dfrange', 'modindx'), .05))
+
+
+@pytest.fixture(scope='module')
+def features():
+    return acoustics.extract_features([os.path.join(SOUNDS, name) for name in SAMPLES]).set_index(pd.Index(SAMPLES))
+
+
+def pitch(name):
+    return int(name.rsplit('_', 1)[1].split('hz')[0]) / 1000
+
+
+@pytest.mark.skipif(not os.path.isfile(R_OUTPUT), reason='no R reference, run: Rscript getAttributes.r tests/data')
+@pytest.mark.parametrize('feature', acoustics.FEATURES)
+def test_matches_r(features, feature):
+    expected = pd.read_csv(R_OUTPUT).set_index('sound.files')
+    assert sorted(expected.index) == SAMPLES
+    np.testing.assert_allclose(features.loc[SAMPLES, feature], expected.loc[SAMPLES, feature],
+                               rtol=TOLERANCE[feature], atol=1e-6, err_msg=feature)
+
+
+@pytest.mark.parametrize('name', SAMPLES)
+def test_fundamental_of_known_pitch(name):
+    signal, rate = acoustics.read_wav(os.path.join(SOUNDS, name))
+    track = acoustics.fundamental(signal, rate)
+    assert np.nanmedian(track) == pytest.approx(pitch(name), rel=.05)
+
+
+@pytest.mark.parametrize('name', SAMPLES)
+def test_spectrum_peaks_at_known_pitch(features, name):
+    rate = acoustics.read_wav(os.path.join(SOUNDS, name))[1]
+    assert features.loc[name, 'mode'] == pytest.approx(pitch(name), rel=.1)  # vibrato spreads the peak
+    assert abs(features.loc[name, 'meandom'] - pitch(name)) <= rate / 2048 / 1000  # one dfreq bin
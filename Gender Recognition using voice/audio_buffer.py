@@ -0,0 +1,175 @@
+"""NumPy versions of the recorder helpers in the gender recognition notebook.
+
+`is_silent`, `normalize`, `trim` and `add_silence` behave like the notebook's functions, but work on int16 NumPy
+arrays instead of looping over `array('h')` sample by sample. `from_bytes` wraps raw PyAudio/WAV data without
+copying, `trim` returns a view, and `normalize` can write in place.
+
+e.g:
+    snd = AudioBuffer()
+    snd.extend(stream.read(CHUNK_SIZE))            # while recording
+    data = add_silence(trim(normalize(snd.view())), 0.5)
+    wf.writeframes(to_bytes(data))
+
+Run `python audio_buffer.py` for a micro-benchmark against the notebook's implementations.
+"""
+import time
+from array import array
+
+import numpy as np
+
+THRESHOLD = 500
+RATE = 16000
+MAXIMUM = 16384
+
+
+def from_bytes(data):
+    "View raw little-endian 16 bit samples as an int16 array (no copy)"
+    return np.frombuffer(data, dtype="<i2")
+
+
+def to_bytes(snd_data):
+    "Little-endian 16 bit bytes of the samples, as written to a WAV file"
+    return np.asarray(snd_data, dtype="<i2").tobytes()
+
+
+def is_silent(snd_data):
+    "Returns 'True' if below the 'silent' threshold"
+    snd_data = np.asarray(snd_data)
+    return snd_data.size == 0 or snd_data.max() < THRESHOLD
+
+
+def normalize(snd_data, out=None):
+    "Average the volume out; pass out=snd_data to scale in place"
+    snd_data = np.asarray(snd_data)
+    peak = np.abs(snd_data.astype(np.int32, copy=False)).max() if snd_data.size else 0
+    if out is None:
+        out = np.empty(snd_data.shape, dtype=np.int16)
+    if not peak:
+        out[...] = snd_data
+        return out
+    # int(i * times) truncates towards zero
+    np.trunc(snd_data * (float(MAXIMUM) / peak), out=out, casting="unsafe")
+    return out
+
+
+def trim(snd_data):
+    "Trim the blank spots at the start and end (returns a view)"
+    snd_data = np.asarray(snd_data)
+    loud = np.flatnonzero(np.abs(snd_data.astype(np.int32, copy=False)) > THRESHOLD)
+    if not loud.size:
+        return snd_data[:0]
+    return snd_data[loud[0]:loud[-1] + 1]
+
+
+def add_silence(snd_data, seconds, rate=RATE):
+    "Add silence to the start and end of 'snd_data' of length 'seconds' (float)"
+    padding = int(seconds * rate)
+    out = np.zeros(len(snd_data) + 2 * padding, dtype=np.int16)
+    out[padding:padding + len(snd_data)] = snd_data
+    return out
+
+
+class AudioBuffer:
+    "Growable int16 sample buffer for recording, in place of extending an array('h') chunk by chunk"
+
+    def __init__(self, capacity=RATE * 10):
+        self._data = np.empty(capacity, dtype=np.int16)
+        self._size = 0
+
+    def extend(self, chunk):
+        "Append raw bytes or samples"
+        samples = from_bytes(chunk) if isinstance(chunk, (bytes, bytearray, memoryview)) else np.asarray(chunk)
+        end = self._size + len(samples)
+        if end > len(self._data):
+            grown = np.empty(max(end, 2 * len(self._data)), dtype=np.int16)
+            grown[:self._size] = self._data[:self._size]
+            self._data = grown
+        self._data[self._size:end] = samples
+        self._size = end
+        return samples
+
+    def view(self):
+        "The recorded samples (no copy)"
+        return self._data[:self._size]
+
+    def __len__(self):
+        return self._size
+
+
+# The notebook's implementations, for the benchmark
+
+def _is_silent_loop(snd_data):
+    return max(snd_data) < THRESHOLD
+
+
+def _normalize_loop(snd_data):
+    times = float(MAXIMUM) / max(abs(i) for i in snd_data)
+    r = array('h')
+    for i in snd_data:
+        r.append(int(i * times))
+    return r
+
+
+def _trim_loop(snd_data):
+    def _trim(snd_data):
+        snd_started = False
+        r = array('h')
+        for i in snd_data:
+            if not snd_started and abs(i) > THRESHOLD:
+                snd_started = True
+                r.append(i)
+            elif snd_started:
+                r.append(i)
+        return r
+
+    snd_data = _trim(snd_data)
+    snd_data.reverse()
+    snd_data = _trim(snd_data)
+    snd_data.reverse()
+    return snd_data
+
+
+def _add_silence_loop(snd_data, seconds):
+    r = array('h', [0 for i in range(int(seconds * RATE))])
+    r.extend(snd_data)
+    r.extend([0 for i in range(int(seconds * RATE))])
+    return r
+
+
+def benchmark(seconds=30, repeat=3):
+    "Time the NumPy helpers against the notebook's loops on `seconds` of synthetic speech-like audio"
+    rng = np.random.default_rng(0)
+    n = seconds * RATE
+    envelope = np.zeros(n)
+    envelope[n // 10:-n // 10] = 1  # silence at both ends
+    samples = (rng.standard_normal(n) * 3000 * envelope).clip(-32768, 32767).astype(np.int16)
+    raw = samples.tobytes()
+    loop_data = array('h', raw)
+    chunks = [raw[i:i + 2048] for i in range(0, len(raw), 2048)]
+
+    def best(fn):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = fn()
+            times.append(time.perf_counter() - start)
+        return min(times), result
+
+    cases = [
+        ("is_silent (per chunk)", lambda: [_is_silent_loop(array('h', c)) for c in chunks],
+         lambda: [is_silent(from_bytes(c)) for c in chunks]),
+        ("normalize", lambda: _normalize_loop(loop_data), lambda: normalize(from_bytes(raw))),
+        ("trim", lambda: _trim_loop(loop_data), lambda: trim(from_bytes(raw))),
+        ("add_silence", lambda: _add_silence_loop(loop_data, 0.5), lambda: add_silence(from_bytes(raw), 0.5)),
+    ]
+    print(f"{seconds} s of 16 kHz audio, best of {repeat}")
+    print(f"{'function':<24}{'loop ms':>10}{'numpy ms':>10}{'speedup':>10}  same result")
+    for name, loop_fn, numpy_fn in cases:
+        loop_time, expected = best(loop_fn)
+        numpy_time, actual = best(numpy_fn)
+        same = np.array_equal(np.asarray(expected), np.asarray(actual))
+        print(f"{name:<24}{loop_time * 1000:>10.2f}{numpy_time * 1000:>10.2f}{loop_time / numpy_time:>9.0f}x  {same}")
+
+
+if __name__ == "__main__":
+    benchmark()
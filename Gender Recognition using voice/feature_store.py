@@ -0,0 +1,229 @@
+"""Content-addressed cache of audio features for the gender recognition notebook.
+
+Features are cached per audio file, keyed by (hash of the file's bytes, feature config), so changing the features
+passed to `extract_feature` only extracts what is missing, and renamed or duplicated files are never decoded twice.
+For training, the cached vectors of a dataset are packed into a few large shards that are memory-mapped and read
+lazily, one batch at a time.
+
+Layout under the cache root:
+    <config key>/config.json                     the feature config
+    <config key>/files/<ab>/<file hash>.npy      one vector per audio file
+    <config key>/datasets/<name>/shard-NNNNN.npy   float32 vectors of a dataset
+    <config key>/datasets/<name>/labels.npy, index.json
+
+e.g:
+    store = FeatureStore("results/feature_cache", mel=True)
+    dataset = store.build_dataset("balanced-all", audio_files, labels)
+    train, valid = train_test_split(np.arange(len(dataset)), test_size=0.1, random_state=7)
+    model.fit(dataset.keras_sequence(64, train), validation_data=dataset.load(valid), epochs=100)
+"""
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import librosa
+import numpy as np
+from tqdm import tqdm
+
+# Length of each feature's vector
+FEATURE_SIZES = {"mfcc": 40, "chroma": 12, "mel": 128, "contrast": 7, "tonnetz": 6}
+# Bump when extract_feature changes what it computes, so old cached vectors are not reused
+EXTRACTOR_VERSION = 1
+
+
+def extract_feature(file_name, **kwargs):
+    """
+    Extract feature from audio file `file_name`
+        Features supported:
+            - MFCC (mfcc)
+            - Chroma (chroma)
+            - MEL Spectrogram Frequency (mel)
+            - Contrast (contrast)
+            - Tonnetz (tonnetz)
+        e.g:
+        `features = extract_feature(path, mel=True, mfcc=True)`
+    """
+    mfcc = kwargs.get("mfcc")
+    chroma = kwargs.get("chroma")
+    mel = kwargs.get("mel")
+    contrast = kwargs.get("contrast")
+    tonnetz = kwargs.get("tonnetz")
+    X, sample_rate = librosa.core.load(file_name)
+    if chroma or contrast:
+        stft = np.abs(librosa.stft(X))
+    result = np.array([])
+    if mfcc:
+        mfccs = np.mean(librosa.feature.mfcc(y=X, sr=sample_rate, n_mfcc=40).T, axis=0)
+        result = np.hstack((result, mfccs))
+    if chroma:
+        chroma = np.mean(librosa.feature.chroma_stft(S=stft, sr=sample_rate).T, axis=0)
+        result = np.hstack((result, chroma))
+    if mel:
+        mel = np.mean(librosa.feature.melspectrogram(y=X, sr=sample_rate).T, axis=0)
+        result = np.hstack((result, mel))
+    if contrast:
+        contrast = np.mean(librosa.feature.spectral_contrast(S=stft, sr=sample_rate).T, axis=0)
+        result = np.hstack((result, contrast))
+    if tonnetz:
+        tonnetz = np.mean(librosa.feature.tonnetz(y=librosa.effects.harmonic(X), sr=sample_rate).T, axis=0)
+        result = np.hstack((result, tonnetz))
+    return result
+
+
+def file_hash(path):
+    """Hash of a file's bytes, so the cache follows content rather than names."""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _save_atomic(path, array):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp, path)
+
+
+def _cache_file(args):
+    """Hash one audio file and extract its features unless cached (runs in a worker process)."""
+    path, files_dir, config, extractor = args
+    key = file_hash(path)
+    target = os.path.join(files_dir, key[:2], f"{key}.npy")
+    if not os.path.isfile(target):
+        _save_atomic(target, np.asarray(extractor(path, **config), dtype=np.float32))
+    return key
+
+
+class FeatureStore:
+    """Per-file feature cache for one feature config (the keyword arguments of `extract_feature`)."""
+
+    def __init__(self, root="results/feature_cache", extractor=extract_feature, **config):
+        self.config = {name: True for name, enabled in sorted(config.items()) if enabled}
+        unknown = set(self.config) - set(FEATURE_SIZES)
+        if unknown:
+            raise ValueError(f"Unknown features: {', '.join(sorted(unknown))}")
+        if not self.config:
+            raise ValueError(f"Enable at least one of: {', '.join(FEATURE_SIZES)}")
+        self.extractor = extractor
+        self.vector_length = sum(FEATURE_SIZES[name] for name in self.config)
+        description = {"features": self.config, "extractor": EXTRACTOR_VERSION}
+        self.key = hashlib.sha1(json.dumps(description, sort_keys=True).encode()).hexdigest()[:16]
+        self.path = os.path.join(root, self.key)
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, "config.json"), "w") as f:
+            json.dump(description, f)
+
+    def cache(self, audio_files, max_workers=None):
+        """
+        Make sure the features of every audio file are cached, extracting missing ones in a process pool.
+        Returns the content hash of each file, in order.
+        """
+        files_dir = os.path.join(self.path, "files")
+        jobs = [(path, files_dir, self.config, self.extractor) for path in audio_files]
+        with ProcessPoolExecutor(max_workers) as pool:
+            chunksize = max(1, min(32, len(jobs) // (8 * (max_workers or os.cpu_count() or 1))))
+            return list(tqdm(pool.map(_cache_file, jobs, chunksize=chunksize), "Caching features", total=len(jobs)))
+
+    def vector(self, key):
+        """Cached features of the file with content hash `key`."""
+        return np.load(os.path.join(self.path, "files", key[:2], f"{key}.npy"))
+
+    def build_dataset(self, name, audio_files, labels, shard_size=8192, max_workers=None):
+        """
+        Cache the features of `audio_files` and pack them with `labels` into memory-mapped shards.
+        The shards are only rewritten when the files' contents or labels change.
+        """
+        labels = np.asarray(labels, dtype=np.float32).reshape(len(audio_files), -1)
+        keys = self.cache(audio_files, max_workers)
+        folder = os.path.join(self.path, "datasets", name)
+        digest = hashlib.sha1("\n".join(keys).encode())
+        digest.update(labels.tobytes())
+        fingerprint = digest.hexdigest()
+
+        index_file = os.path.join(folder, "index.json")
+        if os.path.isfile(index_file):
+            with open(index_file) as f:
+                if json.load(f).get("fingerprint") == fingerprint:
+                    return ShardedDataset(folder)
+
+        shards = []
+        for number, start in enumerate(range(0, len(keys), shard_size)):
+            block = np.stack([self.vector(key) for key in keys[start:start + shard_size]]).astype(np.float32)
+            shards.append({"file": f"shard-{number:05d}.npy", "rows": len(block)})
+            _save_atomic(os.path.join(folder, shards[-1]["file"]), block)
+        _save_atomic(os.path.join(folder, "labels.npy"), labels)
+        index = {"fingerprint": fingerprint, "config": self.config, "vector_length": self.vector_length,
+                 "files": list(audio_files), "shards": shards}
+        with open(index_file + ".tmp", "w") as f:
+            json.dump(index, f)
+        os.replace(index_file + ".tmp", index_file)  # written last: an interrupted build is rebuilt next time
+        return ShardedDataset(folder)
+
+
+class ShardedDataset:
+    """Feature vectors and labels of a dataset built by `FeatureStore.build_dataset`, read lazily."""
+
+    def __init__(self, folder):
+        with open(os.path.join(folder, "index.json")) as f:
+            self.index = json.load(f)
+        self.shards = [np.load(os.path.join(folder, shard["file"]), mmap_mode="r") for shard in self.index["shards"]]
+        self.offsets = np.cumsum([0] + [len(shard) for shard in self.shards])
+        self.labels = np.load(os.path.join(folder, "labels.npy"), mmap_mode="r")
+        self.files = self.index["files"]
+        self.vector_length = self.shards[0].shape[1] if self.shards else self.index["vector_length"]
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def get(self, indices):
+        """Vectors and labels of the rows at `indices`, read shard by shard in sorted order."""
+        indices = np.asarray(indices, dtype=np.int64)
+        X = np.empty((len(indices), self.vector_length), dtype=np.float32)
+        order = np.argsort(indices, kind="stable")
+        sorted_indices = indices[order]
+        shard_of = np.searchsorted(self.offsets, sorted_indices, side="right") - 1
+        for shard in np.unique(shard_of):
+            rows = shard_of == shard
+            X[order[rows]] = self.shards[shard][sorted_indices[rows] - self.offsets[shard]]
+        return X, np.asarray(self.labels[indices])
+
+    def batches(self, batch_size=64, indices=None, shuffle=True, seed=None):
+        """Yield (X, y) batches over `indices` (all rows by default), loading one batch at a time."""
+        indices = np.arange(len(self)) if indices is None else np.asarray(indices)
+        if shuffle:
+            indices = np.random.default_rng(seed).permutation(indices)
+        for start in range(0, len(indices), batch_size):
+            yield self.get(indices[start:start + batch_size])
+
+    def keras_sequence(self, batch_size=64, indices=None, shuffle=True, seed=None):
+        """A keras Sequence over `indices` for `model.fit`, reshuffled after every epoch."""
+        from tensorflow.keras.utils import Sequence
+
+        dataset = self
+        indices = np.arange(len(self)) if indices is None else np.asarray(indices)
+        rng = np.random.default_rng(seed)
+
+        class Batches(Sequence):
+            def __init__(self):
+                super().__init__()
+                self.order = rng.permutation(indices) if shuffle else indices
+
+            def __len__(self):
+                return -(-len(indices) // batch_size)
+
+            def __getitem__(self, number):
+                return dataset.get(self.order[number * batch_size:(number + 1) * batch_size])
+
+            def on_epoch_end(self):
+                if shuffle:
+                    self.order = rng.permutation(indices)
+
+        return Batches()
+
+    def load(self, indices=None):
+        """All rows at `indices` as in-memory arrays, like `load_data` returns."""
+        return self.get(np.arange(len(self)) if indices is None else indices)
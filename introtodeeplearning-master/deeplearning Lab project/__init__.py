@@ -1,5 +1,7 @@
 import mitdeeplearning.util
 
 import mitdeeplearning.lab1
+import mitdeeplearning.lab1_data
 import mitdeeplearning.lab2
 import mitdeeplearning.lab3
+import mitdeeplearning.render
@@ -1,28 +1,86 @@
+import io
 import os
 import regex as re
 import subprocess
+import time
 import urllib
 import numpy as np
 import tensorflow as tf
 
-from IPython.display import Audio
+from IPython.display import Audio, display
+
+from mitdeeplearning.render import SongRenderer
 
 
 cwd = os.path.dirname(__file__)
 
 def load_training_data():
     with open(os.path.join(cwd, "data", "irish.abc"), "r") as f:
-        text = f.read()
-    songs = extract_song_snippet(text)
+        songs = list(iter_songs(f))
+    print("Found {} songs in text".format(len(songs)))
     return songs
 
 def extract_song_snippet(text):
-    pattern = '(^|\n\n)(.*?)\n\n'
-    search_results = re.findall(pattern, text, overlapped=True, flags=re.DOTALL)
-    songs = [song[1] for song in search_results]
+    songs = list(iter_songs(io.StringIO(text)))
     print("Found {} songs in text".format(len(songs)))
     return songs
 
+def iter_songs(f, chunk_size=1 << 16):
+    # Single pass over the file, same songs as the overlapped regex in
+    # _extract_song_snippet_regex: the text from the start and after every blank
+    # line up to the next blank line. Only the current song is held in memory.
+    buffer = ""          # unconsumed text, starting at offset `base` of the stream
+    base = 0
+    starts = [0]         # offsets of songs waiting for their closing blank line
+    search_from = 0      # offset to look for the next blank line from
+    while True:
+        chunk = f.read(chunk_size)
+        buffer += chunk
+        while True:
+            end = buffer.find("\n\n", search_from - base)
+            if end < 0:
+                # a blank line may still start at the last character
+                search_from = max(search_from, base + len(buffer) - 1)
+                break
+            end += base
+            while starts and starts[0] <= end:
+                start = starts.pop(0)
+                yield buffer[start - base:end - base]
+            if end > 0:  # at offset 0 the regex already matched with ^
+                starts.append(end + 2)
+            search_from = end + 1
+        if not chunk:
+            return
+        keep = min(starts[0], search_from) if starts else search_from
+        buffer = buffer[keep - base:]
+        base = keep
+
+def _extract_song_snippet_regex(text):
+    # The original splitter, kept as the reference for the parity test and benchmark
+    pattern = '(^|\n\n)(.*?)\n\n'
+    search_results = re.findall(pattern, text, overlapped=True, flags=re.DOTALL)
+    return [song[1] for song in search_results]
+
+def benchmark_song_splitter(scales=(1, 2, 4), repeat=3):
+    with open(os.path.join(cwd, "data", "irish.abc"), "r") as f:
+        text = f.read()
+    results = []
+    for scale in scales:
+        corpus = text * scale
+        timings = {}
+        for name, split in [("regex", _extract_song_snippet_regex),
+                            ("iter_songs", lambda t: list(iter_songs(io.StringIO(t))))]:
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                n_songs = len(split(corpus))
+                best = min(best, time.perf_counter() - start)
+            timings[name] = best
+        results.append((len(corpus), n_songs, timings["regex"], timings["iter_songs"]))
+        print("{:>10} chars {:>6} songs  regex {:8.3f}s  iter_songs {:8.3f}s  ({:.0f}x)".format(
+            len(corpus), n_songs, timings["regex"], timings["iter_songs"], timings["regex"] / timings["iter_songs"]))
+    return results
+
 def save_song_to_abc(song, filename="tmp"):
     save_name = "{}.abc".format(filename)
     with open(save_name, "w") as f:
@@ -31,30 +89,33 @@ def save_song_to_abc(song, filename="tmp"):
 
 def abc2wav(abc_file):
     path_to_tool = os.path.join(cwd, 'bin', 'abc2wav')
-    cmd = "{} {}".format(path_to_tool, abc_file)
-    return os.system(cmd)
+    return subprocess.run(["bash", path_to_tool, abc_file]).returncode
 
 def play_wav(wav_file):
     return Audio(wav_file)
 
-def play_song(song):
-    basename = save_song_to_abc(song)
-    ret = abc2wav(basename+'.abc')
-    if ret == 0: #did not suceed
-        return play_wav(basename+'.wav')
-    return None
+def play_song(song, renderer=None):
+    wav_file = (renderer or SongRenderer()).render(song)
+    if wav_file is None: # did not succeed
+        return None
+    return play_wav(wav_file)
 
-def play_generated_song(generated_text):
+def play_generated_song(generated_text, renderer=None):
     songs = extract_song_snippet(generated_text)
     if len(songs) == 0:
         print("No valid songs found in generated text. Try training the \
             model longer or increasing the amount of generated music to \
             ensure complete songs are generated!")
+        return []
 
-    for song in songs:
-        play_song(song)
-    print("None of the songs were valid, try training longer to improve \
-        syntax.")
+    wav_files = (renderer or SongRenderer()).render_many(songs)
+    players = [play_wav(wav_file) for wav_file in wav_files if wav_file is not None]
+    for player in players:
+        display(player)
+    if len(players) == 0:
+        print("None of the songs were valid, try training longer to improve \
+            syntax.")
+    return players
 
 def test_batch_func_types(func, args):
     ret = func(*args)
@@ -79,6 +140,17 @@ def test_batch_func_next_step(func, args):
     print("[PASS] test_batch_func_next_step")
     return True
 
+def test_song_splitter_parity(text=None):
+    if text is None:
+        with open(os.path.join(cwd, "data", "irish.abc"), "r") as f:
+            text = f.read()
+    expected = _extract_song_snippet_regex(text)
+    for chunk_size in [1, 7, 1 << 16]:  # also split blank lines across reads
+        songs = list(iter_songs(io.StringIO(text), chunk_size=chunk_size))
+        assert songs == expected, "[FAIL] test_song_splitter_parity: {} songs differ from the regex's {} (chunk_size={})".format(len(songs), len(expected), chunk_size)
+    print("[PASS] test_song_splitter_parity")
+    return True
+
 def test_custom_dense_layer_output(y):
     true_y = np.array([[0.2697859,  0.45750418, 0.66536945]],dtype='float32')
     assert tf.shape(y).numpy().tolist() == list(true_y.shape), "[FAIL] output is of incorrect shape. expected {} but got {}".format(true_y.shape, y.numpy().shape)
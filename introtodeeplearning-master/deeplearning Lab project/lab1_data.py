@@ -0,0 +1,95 @@
+import json
+import os
+import time
+import numpy as np
+
+from mitdeeplearning import lab1
+
+
+cwd = os.path.dirname(__file__)
+default_abc = os.path.join(cwd, "data", "irish.abc")
+
+# The songs are joined with a blank line, like songs_joined in the notebook. The
+# vocabulary is sorted by character, so indices match the notebook's char2idx.
+def vectorize_songs(songs):
+    text = "\n\n".join(songs)
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    vocab_codes, corpus = np.unique(codes, return_inverse=True)
+    vocab = [chr(c) for c in vocab_codes]
+    dtype = np.uint8 if len(vocab) <= 256 else np.uint16
+    return corpus.astype(dtype), vocab
+
+def save_corpus(corpus, vocab, directory):
+    os.makedirs(directory, exist_ok=True)
+    tmp = os.path.join(directory, "corpus.npy.tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, corpus)
+    os.replace(tmp, os.path.join(directory, "corpus.npy"))
+    with open(os.path.join(directory, "vocab.json.tmp"), "w") as f:
+        json.dump(vocab, f)
+    os.replace(os.path.join(directory, "vocab.json.tmp"), os.path.join(directory, "vocab.json"))
+
+# Vectorizes the ABC file once into <abc_file>.cache/ and memory-maps it from then
+# on. The cache is rebuilt when the ABC file is newer.
+def load_corpus(abc_file=default_abc, rebuild=False):
+    directory = abc_file + ".cache"
+    corpus_file = os.path.join(directory, "corpus.npy")
+    vocab_file = os.path.join(directory, "vocab.json")
+    stale = not os.path.isfile(vocab_file) or os.path.getmtime(vocab_file) < os.path.getmtime(abc_file)
+    if rebuild or stale:
+        with open(abc_file, "r") as f:
+            corpus, vocab = vectorize_songs(lab1.iter_songs(f))
+        save_corpus(corpus, vocab, directory)
+    with open(vocab_file, "r") as f:
+        vocab = json.load(f)
+    return np.load(corpus_file, mmap_mode="r"), vocab
+
+def char2idx(vocab):
+    return {u: i for i, u in enumerate(vocab)}
+
+def idx2char(vocab):
+    return np.array(vocab)
+
+# Drop-in for the notebook's get_batch: all batch_size windows of seq_length + 1
+# characters are gathered with one fancy index, x and y are their two overlapping views.
+def get_batch(vectorized_songs, seq_length, batch_size, rng=np.random):
+    n = vectorized_songs.shape[0] - 1
+    idx = rng.choice(n - seq_length, batch_size)
+    windows = np.asarray(vectorized_songs[idx[:, None] + np.arange(seq_length + 1)])
+    return windows[:, :-1], windows[:, 1:]
+
+def batches(vectorized_songs, seq_length, batch_size, seed=None):
+    rng = np.random.default_rng(seed)
+    while True:
+        yield get_batch(vectorized_songs, seq_length, batch_size, rng)
+
+# Endless tf.data pipeline of (x, y) batches. Batches are sampled from the memory-mapped
+# corpus in the generator and prefetched while the model trains on the previous ones.
+def tf_dataset(vectorized_songs, seq_length, batch_size, seed=None, prefetch=None):
+    import tensorflow as tf
+
+    spec = tf.TensorSpec((batch_size, seq_length), tf.as_dtype(vectorized_songs.dtype))
+    dataset = tf.data.Dataset.from_generator(
+        lambda: batches(vectorized_songs, seq_length, batch_size, seed),
+        output_signature=(spec, spec))
+    return dataset.prefetch(tf.data.AUTOTUNE if prefetch is None else prefetch)
+
+# The usual per-sample version, for the benchmark
+def _get_batch_loop(vectorized_songs, seq_length, batch_size):
+    n = vectorized_songs.shape[0] - 1
+    idx = np.random.choice(n - seq_length, batch_size)
+    input_batch = [vectorized_songs[i : i + seq_length] for i in idx]
+    output_batch = [vectorized_songs[i + 1 : i + seq_length + 1] for i in idx]
+    return np.reshape(input_batch, [batch_size, seq_length]), np.reshape(output_batch, [batch_size, seq_length])
+
+def benchmark_get_batch(seq_length=100, batch_sizes=(32, 256, 2048), repeat=20):
+    corpus, vocab = load_corpus()
+    for batch_size in batch_sizes:
+        timings = []
+        for func in [_get_batch_loop, get_batch]:
+            start = time.perf_counter()
+            for _ in range(repeat):
+                func(corpus, seq_length, batch_size)
+            timings.append((time.perf_counter() - start) / repeat)
+        print("batch_size {:>5}  loop {:8.3f}ms  fancy index {:8.3f}ms  ({:.0f}x)".format(
+            batch_size, timings[0] * 1000, timings[1] * 1000, timings[0] / timings[1]))
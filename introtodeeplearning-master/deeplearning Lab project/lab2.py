@@ -1,5 +1,9 @@
+import collections
+import concurrent.futures
 import cv2
+import multiprocessing
 import os
+import queue
 import matplotlib.pyplot as plt
 import numpy as np
 import tensorflow as tf
@@ -7,6 +11,7 @@ import time
 import h5py
 import sys
 import glob
+import threading
 
 IM_SHAPE = (64, 64, 3)
 
@@ -42,17 +47,125 @@ def plot_value_prediction(i, predictions_array, true_label):
   thisplot[true_label].set_color('blue')
 
 
+# Sum-tree over item weights for debiased resampling: sample(n) draws n distinct items
+# with probability proportional to their weights, like np.random.choice(items, n,
+# replace=False, p=weights / weights.sum()), in O(n log N), and update() changes k
+# weights in O(k log N), so nothing is renormalized or rebuilt per batch.
+# Leaves hold the weights, every inner node the sum of its two children.
+class WeightedSampler(object):
+    def __init__(self, items, weights=None):
+        self.items = np.asarray(items)
+        self.size = len(self.items)
+        self.capacity = 1 << max(0, int(self.size - 1).bit_length())
+        self.tree = np.zeros(2 * self.capacity)
+        # sample() zeroes and restores weights, so updates from another thread (e.g. the training loop while
+        # prefetch_batches samples) must wait for it
+        self.lock = threading.RLock()
+        self.set_weights(np.ones(self.size) if weights is None else weights)
+
+    def set_weights(self, weights):
+        weights = np.asarray(weights, dtype=np.float64)
+        assert weights.shape == (self.size,), "expected {} weights, got {}".format(self.size, weights.shape)
+        assert (weights >= 0).all(), "weights must be non-negative"
+        with self.lock:
+            self.tree[self.capacity:self.capacity + self.size] = weights
+            level = self.capacity
+            while level > 1:
+                self.tree[level // 2:level] = self.tree[level:2 * level:2] + self.tree[level + 1:2 * level:2]
+                level //= 2
+
+    # Sets the weights of the items at positions (indices into items)
+    def update(self, positions, weights):
+        positions = np.atleast_1d(np.asarray(positions, dtype=np.int64))
+        weights = np.broadcast_to(np.asarray(weights, dtype=np.float64), positions.shape)
+        assert (weights >= 0).all(), "weights must be non-negative"
+        nodes = positions + self.capacity
+        with self.lock:
+            self.tree[nodes] = weights
+            while len(nodes) and nodes[0] > 1:
+                nodes = np.unique(nodes // 2)
+                self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    # update() for a single item, without numpy's per-call overhead; the caller holds the lock
+    def _set(self, position, weight):
+        tree = self.tree
+        node = position + self.capacity
+        tree[node] = weight
+        node //= 2
+        while node:
+            tree[node] = tree[2 * node] + tree[2 * node + 1]
+            node //= 2
+
+    def weights(self):
+        with self.lock:
+            return self.tree[self.capacity:self.capacity + self.size].copy()
+
+    def total(self):
+        with self.lock:
+            return self.tree[1]
+
+    def _find(self, u):
+        node = 1
+        tree = self.tree
+        while node < self.capacity:
+            node *= 2
+            left = tree[node]
+            if u >= left:
+                u -= left
+                node += 1
+        return node - self.capacity
+
+    # Positions of n distinct items drawn one after another, each with probability
+    # proportional to the weights of the items not drawn yet
+    def sample_positions(self, n, rng=np.random):
+        positions = np.empty(n, dtype=np.int64)
+        taken = np.empty(n)
+        drawn = 0
+        with self.lock:
+            try:
+                for drawn in range(n):
+                    total = self.tree[1]
+                    if total <= 0:
+                        raise ValueError("Fewer items with non-zero weight than size {}".format(n))
+                    position = self._find(rng.random() * total)
+                    while position >= self.size or self.tree[position + self.capacity] <= 0: # rounding at the edges
+                        position = self._find(rng.random() * total)
+                    positions[drawn] = position
+                    taken[drawn] = self.tree[position + self.capacity]
+                    self._set(position, 0.)
+                drawn = n
+            finally:
+                # give the drawn items their weights back
+                if drawn:
+                    self.update(positions[:drawn], taken[:drawn])
+        return positions
+
+    def sample(self, n, rng=np.random):
+        return self.items[self.sample_positions(n, rng)]
+
+
 class TrainingDatasetLoader(object):
-    def __init__(self, data_path):
+    # lazy=True keeps the HDF5 file open and reads only the images of each batch instead
+    # of loading the whole dataset into memory. chunk_cache keeps up to that many of the
+    # dataset's chunks in an LRU cache (0 reads the selected rows directly).
+    def __init__(self, data_path, lazy=False, chunk_cache=0):
 
         print ("Opening {}".format(data_path))
         sys.stdout.flush()
 
         self.cache = h5py.File(data_path, 'r')
+        self.lazy = lazy
 
-        print ("Loading data into memory...")
-        sys.stdout.flush()
-        self.images = self.cache['images'][:]
+        if lazy:
+            self.images = self.cache['images']
+            self.chunk_rows = self.images.chunks[0] if self.images.chunks else 256
+            self.chunk_cache = collections.OrderedDict()
+            self.chunk_cache_size = chunk_cache
+            self.chunk_lock = threading.Lock()
+        else:
+            print ("Loading data into memory...")
+            sys.stdout.flush()
+            self.images = self.cache['images'][:]
         self.labels = self.cache['labels'][:].astype(np.float32)
         self.image_dims = self.images.shape
         n_train_samples = self.image_dims[0]
@@ -62,32 +175,182 @@ class TrainingDatasetLoader(object):
         self.pos_train_inds = self.train_inds[ self.labels[self.train_inds, 0] == 1.0 ]
         self.neg_train_inds = self.train_inds[ self.labels[self.train_inds, 0] != 1.0 ]
 
+    # Images at inds, in the given order. In lazy mode rows are read sorted and
+    # deduplicated, then put back in order.
+    def read_images(self, inds):
+        if not self.lazy:
+            return self.images[inds]
+        unique_inds, order = np.unique(inds, return_inverse=True)
+        if self.chunk_cache_size:
+            rows = self._read_chunked(unique_inds)
+        else:
+            rows = self._read_runs(unique_inds)
+        return rows[order]
+
+    # h5py's fancy indexing is much slower than slicing, so each run of consecutive
+    # indices is read as one slice
+    def _read_runs(self, sorted_inds):
+        rows = np.empty((len(sorted_inds),) + self.image_dims[1:], dtype=self.images.dtype)
+        bounds = np.flatnonzero(np.diff(sorted_inds) != 1) + 1
+        for start, end in zip(np.r_[0, bounds], np.r_[bounds, len(sorted_inds)]):
+            if end > start:
+                rows[start:end] = self.images[sorted_inds[start]:sorted_inds[end - 1] + 1]
+        return rows
+
+    def _read_chunked(self, sorted_inds):
+        rows = np.empty((len(sorted_inds),) + self.image_dims[1:], dtype=self.images.dtype)
+        chunk_of = sorted_inds // self.chunk_rows
+        bounds = np.flatnonzero(np.diff(chunk_of)) + 1
+        for start, end in zip(np.r_[0, bounds], np.r_[bounds, len(sorted_inds)]):
+            chunk = self._chunk(int(chunk_of[start]))
+            rows[start:end] = chunk[sorted_inds[start:end] - chunk_of[start] * self.chunk_rows]
+        return rows
+
+    def _chunk(self, number):
+        with self.chunk_lock:
+            if number in self.chunk_cache:
+                self.chunk_cache.move_to_end(number)
+                return self.chunk_cache[number]
+        chunk = self.images[number * self.chunk_rows:(number + 1) * self.chunk_rows]
+        with self.chunk_lock:
+            self.chunk_cache[number] = chunk
+            while len(self.chunk_cache) > self.chunk_cache_size:
+                self.chunk_cache.popitem(last=False)
+        return chunk
+
     def get_train_size(self):
         return self.train_inds.shape[0]
 
     def get_train_steps_per_epoch(self, batch_size, factor=10):
         return self.get_train_size()//factor//batch_size
 
+    # Sampler over the training faces (or non-faces), in the order of pos_train_inds
+    # (neg_train_inds), to pass to get_batch as p_pos (p_neg)
+    def get_sampler(self, weights=None, faces=True):
+        return WeightedSampler(self.pos_train_inds if faces else self.neg_train_inds, weights)
+
+    # p_pos and p_neg are probability vectors or WeightedSamplers
     def get_batch(self, n, only_faces=False, p_pos=None, p_neg=None, return_inds=False):
         if only_faces:
-            selected_inds = np.random.choice(self.pos_train_inds, size=n, replace=False, p=p_pos)
+            selected_inds = _choose(self.pos_train_inds, n, p_pos)
         else:
-            selected_pos_inds = np.random.choice(self.pos_train_inds, size=n//2, replace=False, p=p_pos)
-            selected_neg_inds = np.random.choice(self.neg_train_inds, size=n//2, replace=False, p=p_neg)
+            selected_pos_inds = _choose(self.pos_train_inds, n//2, p_pos)
+            selected_neg_inds = _choose(self.neg_train_inds, n//2, p_neg)
             selected_inds = np.concatenate((selected_pos_inds, selected_neg_inds))
 
         sorted_inds = np.sort(selected_inds)
-        train_img = (self.images[sorted_inds,:,:,::-1]/255.).astype(np.float32)
+        train_img = (self.read_images(sorted_inds)[...,::-1]/255.).astype(np.float32)
         train_label = self.labels[sorted_inds,...]
         return (train_img, train_label, sorted_inds) if return_inds else (train_img, train_label)
 
     def get_n_most_prob_faces(self, prob, n):
         idx = np.argsort(prob)[::-1]
         most_prob_inds = self.pos_train_inds[idx[:10*n:10]]
-        return (self.images[most_prob_inds,...]/255.).astype(np.float32)
+        return (self.read_images(most_prob_inds)/255.).astype(np.float32)
 
     def get_all_train_faces(self):
-        return self.images[ self.pos_train_inds ]
+        return self.read_images(self.pos_train_inds)
+
+    # Yields get_batch(n, **kwargs) results while a background thread reads the next
+    # ones, so reading from disk overlaps with training. prefetch=2 double-buffers.
+    def prefetch_batches(self, n, steps=None, prefetch=2, **kwargs):
+        batches = queue.Queue(maxsize=prefetch)
+        stop = threading.Event()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+
+        def produce():
+            try:
+                step = 0
+                while not stop.is_set() and (steps is None or step < steps):
+                    put(self.get_batch(n, **kwargs))
+                    step += 1
+                put(None)
+            except Exception as e:
+                put(e)
+
+        thread = threading.Thread(target=produce, daemon=True)
+        thread.start()
+        try:
+            while True:
+                batch = batches.get()
+                if batch is None:
+                    return
+                if isinstance(batch, Exception):
+                    raise batch
+                yield batch
+        finally:
+            stop.set()
+            thread.join()
+
+
+def _choose(inds, size, p):
+    if isinstance(p, WeightedSampler):
+        return p.sample(size)
+    return np.random.choice(inds, size=size, replace=False, p=p)
+
+# Time per batch of np.random.choice with a probability vector against a
+# WeightedSampler, and the time to update 1% of the weights, as N grows
+def benchmark_sampler(sizes=(10**4, 10**5, 10**6, 4 * 10**6), batch_size=32, repeat=10):
+    rng = np.random.default_rng(0)
+    for n in sizes:
+        weights = rng.random(n)
+        sampler = WeightedSampler(np.arange(n), weights)
+        changed = rng.choice(n, n // 100, replace=False)
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            np.random.choice(n, size=batch_size, replace=False, p=weights / weights.sum())
+        choice = (time.perf_counter() - start) / repeat
+        start = time.perf_counter()
+        for _ in range(repeat):
+            sampler.sample(batch_size)
+        tree = (time.perf_counter() - start) / repeat
+        start = time.perf_counter()
+        for _ in range(repeat):
+            sampler.update(changed, rng.random(len(changed)))
+        update = (time.perf_counter() - start) / repeat
+        print("N {:>9}  np.random.choice {:9.2f}ms  sum-tree {:7.2f}ms  ({:.1f}x)  update 1% {:7.2f}ms".format(
+            n, choice * 1000, tree * 1000, choice / tree, update * 1000))
+
+# Peak RSS of this process in MB, or None where the resource module is missing (Windows)
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024. / 1024. if sys.platform == "darwin" else peak / 1024. # bytes on macOS, kB elsewhere
+
+def _measure_loader(data_path, batch_size, lazy, chunk_cache):
+    start = time.perf_counter()
+    loader = TrainingDatasetLoader(data_path, lazy=lazy, chunk_cache=chunk_cache)
+    loader.get_batch(batch_size)
+    first_batch = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in loader.prefetch_batches(batch_size, steps=20):
+        pass
+    per_batch = (time.perf_counter() - start) / 20
+    return first_batch, per_batch, _peak_rss_mb()
+
+# Time to first batch, time per batch and peak RSS of the eager and the lazy loaders.
+# Each loader runs in a fresh process so their memory use doesn't mix.
+def benchmark_loader(data_path, batch_size=32, chunk_cache=64):
+    modes = [("eager", False, 0), ("lazy", True, 0), ("lazy + chunk cache", True, chunk_cache)]
+    results = {}
+    for name, lazy, cache in modes:
+        with concurrent.futures.ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            results[name] = pool.submit(_measure_loader, data_path, batch_size, lazy, cache).result()
+        first_batch, per_batch, peak_rss = results[name]
+        print("{:<20} first batch {:8.3f}s  per batch {:8.2f}ms  peak RSS {}".format(
+            name, first_batch, per_batch * 1000, "unavailable" if peak_rss is None else "{:8.1f} MB".format(peak_rss)))
+    return results
 
 
 def get_test_faces():
@@ -0,0 +1,86 @@
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+cwd = os.path.dirname(__file__)
+default_synthesizer = ["bash", os.path.join(cwd, "bin", "abc2wav")]
+default_cache_dir = os.path.join(tempfile.gettempdir(), "mitdeeplearning_songs")
+
+# Renders ABC songs to WAV files with a synthesizer command, by default bin/abc2wav
+# (abc2midi then timidity). The command is run as `synthesizer + [abc_file]` and must
+# write the .wav next to the .abc file and exit with 0; any program doing that can
+# stand in for the real tools, e.g. in tests.
+#
+# Every render runs in its own temporary directory, so renders never clobber each
+# other, and at most max_workers synthesizers run at a time. Finished WAVs are cached
+# under cache_dir by a hash of the song and the synthesizer, so a song that was
+# generated before is not synthesized again.
+class SongRenderer:
+    def __init__(self, cache_dir=default_cache_dir, synthesizer=None, max_workers=None, timeout=120):
+        self.cache_dir = cache_dir
+        self.synthesizer = list(synthesizer or default_synthesizer)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.synthesized = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, song):
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update("\0".join(self.synthesizer).encode())
+        digest.update(b"\0")
+        digest.update(song.encode())
+        return digest.hexdigest()
+
+    def wav_path(self, song):
+        return os.path.join(self.cache_dir, self.key(song) + ".wav")
+
+    # Path of the song's WAV file, or None if the synthesizer failed on it
+    def render(self, song):
+        target = self.wav_path(song)
+        if os.path.isfile(target):
+            return target
+        workdir = tempfile.mkdtemp(prefix="render-", dir=self.cache_dir)
+        try:
+            abc_file = os.path.join(workdir, "song.abc")
+            with open(abc_file, "w") as f:
+                f.write(song)
+            try:
+                ret = subprocess.run(self.synthesizer + [abc_file], cwd=workdir, timeout=self.timeout,
+                                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode
+            except subprocess.TimeoutExpired:
+                return None
+            with self._lock:
+                self.synthesized += 1
+            wav_file = os.path.join(workdir, "song.wav")
+            if ret != 0 or not os.path.isfile(wav_file) or not os.path.getsize(wav_file):
+                return None
+            os.replace(wav_file, target)  # atomic: the cache never holds a partial file
+            return target
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    # Renders all songs, max_workers at a time; each distinct song is rendered once.
+    # Returns one WAV path (or None) per song, in order.
+    def render_many(self, songs):
+        songs = list(songs)
+        unique = list(dict.fromkeys(songs))
+        with ThreadPoolExecutor(min(self.max_workers, max(1, len(unique)))) as pool:
+            paths = dict(zip(unique, pool.map(self.render, unique)))
+        return [paths[song] for song in songs]
+
+    # Same as render_many, with the WAV files' contents in place of their paths
+    def render_buffers(self, songs):
+        buffers = []
+        for path in self.render_many(songs):
+            if path is None:
+                buffers.append(None)
+                continue
+            with open(path, "rb") as f:
+                buffers.append(f.read())
+        return buffers